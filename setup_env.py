@@ -2,6 +2,9 @@ import os
 import subprocess
 import sys
 
+PREFLIGHT_SCRIPT = "TM Preflight.R"
+PREFLIGHT_STAMP = "TM Preflight.ok"
+
 def check_and_install_packages():
     # Install remaining packages from requirements.txt without printing "Requirement already satisfied"
     try:
@@ -25,8 +28,32 @@ def create_venv():
 
     check_and_install_packages()
 
+def preflight_done():
+    # the stamp is written by the preflight once every package loads
+    return (os.path.exists(PREFLIGHT_STAMP)
+            and os.path.getmtime(PREFLIGHT_STAMP) >= os.path.getmtime(PREFLIGHT_SCRIPT))
+
+def run_r_preflight(force=False):
+    # install and check the R packages once, so the analysis scripts and the
+    # R worker only attach them on startup
+    if not force and preflight_done():
+        print("R packages already checked (delete 'TM Preflight.ok' or use --force-preflight to check again)")
+        return
+    from tm_worker import find_rscript
+    try:
+        rscript = find_rscript()
+    except OSError as e:
+        print(f"R preflight skipped: {e}")
+        return
+    print("Checking R packages, the first run installs them and can take a while...")
+    try:
+        subprocess.check_call([rscript, PREFLIGHT_SCRIPT])
+    except subprocess.CalledProcessError as e:
+        sys.exit(f"Error installing R packages: {e}")
+
 def main():
     create_venv()
+    run_r_preflight(force="--force-preflight" in sys.argv[1:])
     
     # Print activation instructions
     if os.name == "nt":
@@ -0,0 +1,9 @@
+# ---------------------------------------
+# pytest setup
+# ---------------------------------------
+# the modules live next to the app in the repository root, not in a package
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
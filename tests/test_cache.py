@@ -0,0 +1,66 @@
+# ---------------------------------------
+# tests for tm_cache
+# ---------------------------------------
+
+import os
+
+from tm_cache import ArtifactCache, filter_words_sha256, make_key, replaced_atomically
+
+
+def test_make_key_is_stable_and_order_sensitive():
+    assert make_key("book", "Sheet1", {"b": 1, "a": 2}) == make_key("book", "Sheet1", {"a": 2, "b": 1})
+    assert make_key("book", "Sheet1", "col") != make_key("book", "col", "Sheet1")
+    assert len(make_key("x")) == 64
+
+
+def test_filter_words_hash_ignores_order_duplicates_and_blank_lines(tmp_path):
+    first, second = tmp_path / "first.txt", tmp_path / "second.txt"
+    first.write_text("zorg\nwachttijd\n")
+    second.write_text("wachttijd\n\nzorg\nzorg\n")
+    assert filter_words_sha256(str(first)) == filter_words_sha256(str(second))
+    empty = tmp_path / "empty.txt"
+    empty.write_text("\n\n")
+    assert filter_words_sha256(str(tmp_path / "missing.txt")) == filter_words_sha256(str(empty))
+
+
+def test_evict_removes_least_recently_used_entries(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_entries=2, suffix=".rds")
+    for age, key in enumerate(["old", "middle", "new"]):
+        path = cache.path_for(key)
+        open(path, "w").close()
+        os.utime(path, (1000 + age, 1000 + age))
+    assert cache.touch("old")  # now the most recently used
+    removed = cache.evict()
+    assert removed == [cache.path_for("middle")]
+    assert cache.contains("old") and cache.contains("new")
+
+
+def test_touch_and_entries_ignore_other_files(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_entries=1, suffix=".json")
+    (tmp_path / "other.feather").write_text("")
+    assert not cache.touch("missing")
+    assert cache.entries() == []
+    assert cache.evict() == []
+
+
+def test_replaced_atomically_uses_a_temp_file_of_its_own(tmp_path):
+    target = str(tmp_path / "entry.feather")
+    with replaced_atomically(target) as first, replaced_atomically(target) as second:
+        assert first != second
+        open(first, "w").write("first")
+        open(second, "w").write("second")
+    assert open(target).read() == "first"  # the outer block finished last
+    assert os.listdir(tmp_path) == ["entry.feather"]
+
+
+def test_replaced_atomically_keeps_the_old_file_on_errors(tmp_path):
+    target = tmp_path / "entry.json"
+    target.write_text("old")
+    try:
+        with replaced_atomically(str(target)) as tmp:
+            open(tmp, "w").write("half")
+            raise RuntimeError("write failed")
+    except RuntimeError:
+        pass
+    assert target.read_text() == "old"
+    assert os.listdir(tmp_path) == ["entry.json"]
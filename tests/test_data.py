@@ -0,0 +1,66 @@
+# ---------------------------------------
+# tests for the token index in tm_data
+# ---------------------------------------
+
+import os
+import threading
+
+import pandas as pd
+
+from tm_data import FrameCache, TokenIndex, TopWords, Workbook, tokenize_responses
+
+
+TEXTS = ["Goed, goed en snel", "Niet snel", "Goed"]
+
+
+def test_tokenize_responses_codes_end_every_response():
+    codes, vocab = tokenize_responses(TEXTS)
+    assert vocab[0] == "\x00"
+    assert [vocab[c] for c in codes] == ["goed", "goed", "en", "snel", "\x00", "niet", "snel", "\x00", "goed", "\x00"]
+    assert (codes == 0).sum() == len(TEXTS)
+
+
+def test_tokenize_responses_empty():
+    codes, vocab = tokenize_responses([])
+    assert len(codes) == 0 and vocab == ["\x00"]
+
+
+def test_token_index_counts_and_top_words():
+    index = TokenIndex(TEXTS)
+    assert index.document_count == 3
+    assert index.counts["goed"] == 3
+    assert "\x00" not in index.counts
+    assert index.top_words(set(), 2) == [("goed", 3), ("snel", 2)]
+    assert index.top_words({"goed"}, 1) == [("snel", 2)]
+    assert index.frequencies({"goed", "snel"}) == {"en": 1, "niet": 1}
+
+
+def test_top_words_exclude_refills():
+    words = TopWords(TokenIndex(TEXTS), {"en"}, 2)
+    assert words.shown == [("goed", 3), ("snel", 2)]
+    words.exclude(["goed"])
+    assert words.shown == [("snel", 2), ("niet", 1)]
+
+
+def test_write_column_from_several_threads(tmp_path):
+    book_path = str(tmp_path / "book.xlsx")
+    pd.DataFrame({"Antwoord": [f"antwoord {i}" for i in range(200)]}).to_excel(book_path, index=False)
+    workbook = Workbook(book_path, FrameCache(64 * 1024 * 1024))
+    target = str(tmp_path / "column.feather")
+    errors = []
+
+    def write():
+        try:
+            workbook.write_column("Sheet1", "Antwoord", target)
+        except Exception as error:  # noqa: BLE001
+            errors.append(error)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    frame = pd.read_feather(target)
+    assert frame["row_id"].tolist() == list(range(1, 201))
+    assert sorted(os.listdir(tmp_path)) == ["book.xlsx", "column.feather"]
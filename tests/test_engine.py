@@ -0,0 +1,110 @@
+# ---------------------------------------
+# tests for tm_engine
+# ---------------------------------------
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tm_engine import prepare_corpus, prune_vocabulary, run_analysis, stopwords_for, warm_start_lda
+
+
+RESPONSES = [
+    "De wachttijd bij de huisarts was veel te lang",
+    "de WACHTTIJD bij de huisarts was veel te lang!",
+    "Vriendelijke verpleging en goede uitleg over de behandeling",
+    "Parkeren bij het ziekenhuis is duur en lastig",
+    "De verpleging was vriendelijk, de uitleg duidelijk",
+    "Lange wachttijd voor een afspraak bij de specialist",
+    "-",
+    None,
+    "Het parkeren was lastig en de parkeerplaats duur",
+    "Goede behandeling door de specialist, duidelijke uitleg",
+]
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({"Antwoord": RESPONSES})
+
+
+ENGLISH_RESPONSES = [
+    "The waiting time at the doctor was far too long",
+    "Friendly nurses and a clear explanation of the treatment",
+    "Parking at the hospital is expensive and difficult",
+    "The nurses were friendly and the explanation was clear",
+    "Long waiting time for an appointment with the specialist",
+    "Parking was difficult and the car park expensive",
+]
+
+
+def test_stopwords_follow_the_language():
+    english = pd.DataFrame({"Answer": ENGLISH_RESPONSES})
+    vocab = set(prepare_corpus(english, "Answer", language="en")["vocab"])
+    assert {"the", "was", "and", "at"}.isdisjoint(vocab)
+    assert {"waiting", "nurses", "parking"} <= vocab
+    # "door" and "men" are dutch stopwords, kept in english responses
+    doors = pd.DataFrame({"Answer": ["the men left the door open", "open the door please"]})
+    assert {"door", "men"} <= set(prepare_corpus(doors, "Answer", language="en")["vocab"])
+    result = run_analysis(english, "Answer", 2, n_jobs=1, language="en")
+    assert "the" not in set(result["top_terms"]["term"])
+    with pytest.raises(ValueError):
+        stopwords_for("xx")
+
+
+def test_prepare_corpus_folds_duplicates_into_weights(df):
+    corpus = prepare_corpus(df, "Antwoord")
+    assert len(corpus["data_selection"]) == 8  # "-" and the missing answer are dropped
+    assert corpus["dtm"].shape[0] == 7
+    assert corpus["weights"].sum() == 8
+    assert corpus["data_selection"]["row_id"].tolist() == [1, 2, 3, 4, 5, 6, 9, 10]
+
+
+def test_prune_vocabulary_counts_duplicates(df):
+    corpus = prepare_corpus(df, "Antwoord")
+    dtm, vocab, rows = prune_vocabulary(corpus["dtm"], corpus["vocab"], corpus["weights"], min_docfreq=2)
+    # "huisarts" is in one unique document that stands for two responses
+    assert "huisarts" in vocab
+    assert "afspraak" not in vocab
+    assert dtm.shape == (len(rows), len(vocab))
+    _, capped, _ = prune_vocabulary(corpus["dtm"], corpus["vocab"], corpus["weights"], max_vocab=3)
+    assert len(capped) == 3
+
+
+def test_run_analysis_shapes(df):
+    stages = []
+    result = run_analysis(df, "Antwoord", 3, n_jobs=1, on_stage=lambda stage, **counts: stages.append(stage))
+    assert result["model"].n_components == 3
+    assert set(result["top_terms"]["topic"]) == {1, 2, 3}
+    gamma = result["gamma"].groupby("document")["gamma"].sum()
+    assert np.allclose(gamma, 1.0)
+    # one row per unique document, duplicates counted in copies
+    assert len(result["documents"]) == 7
+    assert result["documents"]["copies"].sum() == len(result["data_selection"])
+    assert not result["warm_started"]
+    assert stages[-1] == "Document-topic probabilities generated and merged with data"
+
+
+def test_run_analysis_warm_starts_after_filter_words(df):
+    first = run_analysis(df, "Antwoord", 3, n_jobs=1)
+    second = run_analysis(None, "Antwoord", 3, filter_words=["wachttijd"], n_jobs=1,
+                          corpus=first["corpus"], previous=first)
+    assert second["warm_started"]
+    assert "wachttijd" not in second["vocab"]
+    assert second["model"].components_.shape == (3, len(second["vocab"]))
+    # another number of topics is fitted from scratch
+    third = run_analysis(None, "Antwoord", 2, n_jobs=1, corpus=first["corpus"], previous=first)
+    assert not third["warm_started"]
+
+
+def test_warm_start_needs_a_subset_of_the_old_vocabulary(df):
+    first = run_analysis(df, "Antwoord", 2, n_jobs=1)
+    vocab = np.append(first["vocab"], "nieuwwoord")
+    dtm = first["dtm"][:, :1]
+    assert warm_start_lda(first["model"], first["vocab"], dtm, vocab, n_jobs=1) is None
+
+
+def test_run_analysis_multiple_seeds(df):
+    result = run_analysis(df, "Antwoord", 2, n_jobs=1, seeds=(20, 21))
+    assert len(result["seed_runs"]) == 2
+    assert result["model"].n_components == 2
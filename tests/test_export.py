@@ -0,0 +1,52 @@
+# ---------------------------------------
+# tests for tm_export
+# ---------------------------------------
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tm_export import XLSX_CHUNK_ROWS, long_gamma_table, write_exports, write_table
+
+
+@pytest.fixture
+def table():
+    return pd.DataFrame({
+        "row_id": [1, 2, 3],
+        "Antwoord": ["lange wachttijd", "=SUM(A1:A2)", "http://example.org"],
+        "dominant_topic": [2, 1, 2],
+        "topic_1": [0.25, 0.75, np.nan],
+        "topic_2": [0.75, 0.25, 0.5],
+        "positive": [True, False, True],
+    })
+
+
+def test_xlsx_round_trip(tmp_path, table):
+    path = str(tmp_path / "export.xlsx")
+    write_table(table, path, "xlsx")
+    pd.testing.assert_frame_equal(pd.read_excel(path), table)
+
+
+def test_xlsx_round_trip_over_several_chunks(tmp_path):
+    rows = XLSX_CHUNK_ROWS + 5
+    table = pd.DataFrame({"row_id": np.arange(1, rows + 1), "gamma": np.linspace(0, 1, rows)})
+    path = str(tmp_path / "export.xlsx")
+    write_table(table, path, "xlsx")
+    pd.testing.assert_frame_equal(pd.read_excel(path), table)
+
+
+def test_write_exports_formats_and_long_gamma(tmp_path, table):
+    gamma = pd.DataFrame({"document": [1, 1, 2, 2], "topic": [1, 2, 1, 2], "gamma": [0.9, 0.1, 0.3, 0.7]})
+    data_selection = pd.DataFrame({"id": [1, 2, 3], "doc_id": [1, 2, 1]})
+    long_gamma = long_gamma_table(gamma, data_selection)
+    assert len(long_gamma) == 6
+    written = write_exports(table, str(tmp_path / "export.xlsx"), ("xlsx", "csv"), long_gamma=long_gamma)
+    assert [p[len(str(tmp_path)) + 1:] for p in written] == [
+        "export.xlsx", "export_gamma_long.xlsx", "export.csv", "export_gamma_long.csv"]
+    pd.testing.assert_frame_equal(pd.read_csv(written[3]), long_gamma)
+    pd.testing.assert_frame_equal(pd.read_excel(written[1]), long_gamma)
+
+
+def test_unknown_format(tmp_path, table):
+    with pytest.raises(ValueError):
+        write_table(table, str(tmp_path / "export.json"), "json")
@@ -0,0 +1,42 @@
+# ---------------------------------------
+# tests for tm_results
+# ---------------------------------------
+
+import pandas as pd
+
+from tm_results import DocumentTopics, ResultBundle, is_bundle, write_bundle
+
+
+def write_documents(result_dir):
+    documents = pd.DataFrame({
+        "document": [1, 2, 3, 4],
+        "text": ["a", "b", "c", "d"],
+        "copies": [1, 1, 2, 1],
+        "dominant_topic": [1, 2, 2, 1],
+        "dominant_gamma": [0.9, 0.6, 0.8, 0.7],
+        "topic_1": [0.9, 0.4, 0.2, 0.7],
+        "topic_2": [0.1, 0.6, 0.8, 0.3],
+    })
+    write_bundle(str(result_dir), {"documents": documents, "missing": None}, engine="Python")
+
+
+def test_bundle_roundtrip(tmp_path):
+    write_documents(tmp_path)
+    assert is_bundle(str(tmp_path))
+    bundle = ResultBundle(str(tmp_path))
+    assert bundle.has("documents") and not bundle.has("missing")
+    assert bundle.info("engine") == "Python"
+    assert len(bundle.table("documents")) == 4
+
+
+def test_document_topics_sort_filter_page(tmp_path):
+    write_documents(tmp_path)
+    documents = DocumentTopics(ResultBundle(str(tmp_path)))
+    assert documents.topics == [1, 2]
+    documents.sort(2)
+    assert [row["document"] for row in documents.page(0, 2)] == [3, 2]
+    documents.filter(1)
+    assert len(documents) == 2 and documents.total() == 4
+    assert [row["document"] for row in documents.page(0, 10)] == [4, 1]
+    documents.sort(None)
+    assert [row["document"] for row in documents.page(1, 10)] == [4]
@@ -0,0 +1,63 @@
+# ---------------------------------------
+# tests for tm_sentiment
+# ---------------------------------------
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import tm_sentiment
+from tm_data import TokenIndex
+from tm_sentiment import Lexicon, ScoreCache, score_column, score_texts, text_hashes
+
+
+@pytest.fixture(scope="module")
+def lexicon():
+    return Lexicon("nl")
+
+
+def test_unknown_language_raises():
+    with pytest.raises(ValueError):
+        Lexicon("xx")
+
+
+def test_negation_and_intensifier(lexicon):
+    good, not_good, very_good, neutral = score_texts(["goed", "niet goed", "heel goed", "de tafel"], lexicon)
+    assert good > 0
+    assert not_good < 0 and abs(not_good) < good
+    assert very_good > good
+    assert neutral == 0
+
+
+def test_negation_does_not_cross_responses(lexicon):
+    alone = score_texts(["goed"], lexicon)[0]
+    after_negation = score_texts(["echt niet", "goed"], lexicon)[1]
+    assert after_negation == pytest.approx(alone)
+
+
+def test_batches_match_one_pass(lexicon):
+    texts = ["goed", "slecht", "niet slecht", "leuk en goed", "erg slecht"] * 3
+    assert np.allclose(score_texts(texts, lexicon, batch_size=4), score_texts(texts, lexicon))
+
+
+def test_score_cache_roundtrip(tmp_path, lexicon):
+    hashes = text_hashes(["goed", "slecht"])
+    cache = ScoreCache(str(tmp_path), lexicon, max_entries=10)
+    cache.add(hashes, np.array([0.5, -0.5]))
+    cache.save()
+    reloaded = ScoreCache(str(tmp_path), lexicon)
+    assert np.allclose(reloaded.lookup(hashes), [0.5, -0.5])
+    assert np.isnan(reloaded.lookup(text_hashes(["leuk"]))).all()
+
+
+def test_score_column_uses_cache_and_token_index(tmp_path, lexicon, monkeypatch):
+    series = pd.Series(["goed", None, "slecht", "goed"])
+    index = TokenIndex(series.dropna().astype(str).tolist())
+    scores = score_column(series, "nl", str(tmp_path), index=index)
+    assert scores["row_id"].tolist() == [1, 3, 4]
+    assert scores["sentiment_label"].tolist() == ["positive", "negative", "positive"]
+    # a second run is answered from the cache without scoring
+    monkeypatch.setattr(tm_sentiment, "score_codes", None)
+    monkeypatch.setattr(tm_sentiment, "score_texts", None)
+    again = score_column(series, "nl", str(tmp_path))
+    assert np.allclose(again["sentiment"], scores["sentiment"])
@@ -0,0 +1,67 @@
+# ---------------------------------------
+# tests for the job keys of tm_service and tm_config
+# ---------------------------------------
+
+import pytest
+
+import tm_service
+from tm_config import PIPELINE_CONFIG, dataset_key, model_key
+from tm_service import AnalysisService, normalize_request, request_key
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "book.xlsx"
+    path.write_bytes(b"not really a workbook")
+    return str(path)
+
+
+@pytest.fixture
+def service(tmp_path):
+    return AnalysisService(str(tmp_path / "service"), workers=1, queue_size=1)
+
+
+def test_request_key_ignores_filter_word_order_and_case(workbook):
+    first = normalize_request({"kind": "analysis", "file": workbook, "column": "A", "filter_words": ["Zorg", "wacht"]})
+    second = normalize_request({"kind": "analysis", "file": workbook, "column": "A", "filter_words": ["wacht", "zorg "]})
+    assert request_key(first) == request_key(second)
+    other = normalize_request({"kind": "analysis", "file": workbook, "column": "A", "topics": 4})
+    assert request_key(other) != request_key(first)
+
+
+def test_request_key_follows_the_settings(workbook, monkeypatch):
+    request = normalize_request({"kind": "analysis", "file": workbook, "column": "A"})
+    key = request_key(request)
+    monkeypatch.setitem(tm_service.config, "min_docfreq", 5)
+    assert request_key(request) != key
+
+
+def test_normalize_request_rejects_bad_input(workbook):
+    with pytest.raises(ValueError):
+        normalize_request({"kind": "delete", "file": workbook, "column": "A"})
+    with pytest.raises(ValueError):
+        normalize_request({"kind": "analysis", "file": workbook + ".missing", "column": "A"})
+
+
+@pytest.mark.parametrize("job_id", ["../../etc/passwd", "A" * 64, "a" * 63, "a" * 64 + "\n", ""])
+def test_get_rejects_malformed_ids(service, job_id):
+    assert service.get(job_id) is None
+
+
+def test_get_unknown_id(service):
+    assert service.get("0" * 64) is None
+
+
+def test_model_key_follows_filter_words_and_pruning(tmp_path):
+    filter_file = tmp_path / "filter.txt"
+    filter_file.write_text("zorg\n")
+    settings = dict(PIPELINE_CONFIG)
+    key = model_key("hash", "Sheet1", "A", 5, str(filter_file), settings)
+    assert key == model_key("hash", "Sheet1", "A", 5, str(filter_file), dict(settings))
+    filter_file.write_text("zorg\nwacht\n")
+    assert model_key("hash", "Sheet1", "A", 5, str(filter_file), settings) != key
+    pruned = dict(settings, min_docfreq=2)
+    assert model_key("hash", "Sheet1", "A", 5, str(filter_file), pruned) != \
+        model_key("hash", "Sheet1", "A", 5, str(filter_file), settings)
+    # the tokens do not depend on pruning
+    assert dataset_key("hash", "Sheet1", "A", pruned) == dataset_key("hash", "Sheet1", "A", settings)
@@ -0,0 +1,348 @@
+# ---------------------------------------
+# headless batch runs
+# ---------------------------------------
+# runs the export pipeline over many workbooks/sheets/columns without the ui,
+# e.g. as a nightly job:
+#
+#   python tm_batch.py "surveys/*.xlsx" --topics 5 --jobs 4
+#   python tm_batch.py --manifest jobs.json
+#
+# jobs are spread over a process pool; every process keeps its own r worker
+# (or runs the python engine). a job whose inputs (workbook, sheet, column,
+# number of topics, filter words, engine and scripts) are unchanged since its
+# last successful run is skipped. models and column files go to the same
+# .tm_cache directory the app uses, so the app can reuse them and vice versa.
+#
+# manifest format (paths relative to the manifest file):
+#   {"defaults": {"topics": 5, "engine": "R"},
+#    "jobs": [{"file": "survey.xlsx", "sheet": "Sheet1", "columns": ["q1", "q2"],
+#              "filter_words": "filter_q1.txt", "topics": 6}]}
+# a job without "columns" (or "column") uses every open-text column of the sheet,
+# a job without "sheet" every sheet. "formats" (["xlsx", "csv", "parquet"])
+# and "long_gamma" choose the export files, like --formats/--long-gamma.
+
+import argparse
+import concurrent.futures
+import datetime
+import glob
+import json
+import os
+import sys
+import time
+
+from tm_cache import ArtifactCache, file_sha256, make_key
+from tm_config import PIPELINE_CONFIG, column_key, dataset_key, model_key, pipeline_args, pruning_options, seeds
+from tm_data import FrameCache, Workbook
+from tm_profile import parse_event
+
+
+# ---------------------------------------
+# config section
+# ---------------------------------------
+config = {
+    # pipeline settings and cache layout, the same as the app's unless changed here
+    **PIPELINE_CONFIG,
+    "tagger_workers": 1,  # per job, the pool already runs jobs side by side
+    "export_formats": ["xlsx"],  # any of xlsx, csv, parquet
+    "data_cache_mb": 256,  # per process
+    "default_topics": 5,
+    "default_engine": "R",
+    # a column counts as open text when most values are strings of at least this many words on average
+    "open_text_min_share": 0.5,
+    "open_text_min_words": 3,
+    "export_script": "TM Single file Export.R",
+    "export_done_marker": "Export written",
+}
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_r_pool = None  # r worker of the current pool process
+_rscript = None
+_workbooks = {}  # path -> Workbook, per process
+
+OUTPUT_PREFIX = "Tamam_output_tm_analysis_"
+
+
+def output_name(column_name, sheet_name=None):
+    # same file name the export script uses; the sheet is added when several sheets share a column name
+    if sheet_name:
+        return f"{OUTPUT_PREFIX}{sheet_name}_{column_name}.xlsx"
+    return f"{OUTPUT_PREFIX}{column_name}.xlsx"
+
+
+def get_workbook(path):
+    if path not in _workbooks:
+        _workbooks[path] = Workbook(path, FrameCache(config["data_cache_mb"] * 1024 * 1024))
+    return _workbooks[path]
+
+
+def open_text_columns(workbook, sheet_name):
+    # columns whose values are mostly free text answers
+    columns = []
+    for column_name in workbook.columns(sheet_name):
+        values = workbook.column(sheet_name, column_name).dropna()
+        if values.empty:
+            continue
+        texts = values[values.map(lambda v: isinstance(v, str))]
+        if len(texts) < config["open_text_min_share"] * len(values):
+            continue
+        if texts.str.count(r"\w+").mean() >= config["open_text_min_words"]:
+            columns.append(str(column_name))
+    return columns
+
+
+def engine_version(engine):
+    # hash of the code that produces the export, so changed scripts rerun their jobs
+    if engine == "Python":
+        paths = [os.path.join(SCRIPT_DIR, "tm_engine.py")]
+    else:
+        paths = [os.path.join(SCRIPT_DIR, config["export_script"]), os.path.join(SCRIPT_DIR, "TM Common.R")]
+    return [file_sha256(p) for p in paths if os.path.exists(p)]
+
+
+class BatchJob:
+    # one workbook/sheet/column export
+    def __init__(self, file, sheet, column, topics, filter_words=None, engine="R", output=None, formats=None,
+                 long_gamma=False):
+        self.file = os.path.abspath(file)
+        self.sheet = sheet or ""
+        self.column = column
+        self.topics = int(topics)
+        self.filter_words = os.path.abspath(filter_words) if filter_words else ""
+        self.engine = engine
+        self.output = output or os.path.join(os.path.dirname(self.file), output_name(column))
+        self.formats = list(formats or config["export_formats"])
+        self.long_gamma = bool(long_gamma)
+
+    @property
+    def cache_dir(self):
+        return os.path.join(os.path.dirname(self.file), config["cache_dir_name"])
+
+    def model_key(self):
+        return model_key(file_sha256(self.file), self.sheet, self.column, self.topics, self.filter_words, config)
+
+    def key(self):
+        return make_key(self.model_key(), self.engine, engine_version(self.engine), self.output, self.formats,
+                        self.long_gamma)
+
+    def marker_path(self):
+        return os.path.join(self.cache_dir, "batch", self.key() + ".json")
+
+    def is_done(self):
+        # finished before with the same inputs, and the output is still there
+        return os.path.exists(self.marker_path()) and all(os.path.exists(path) for path in self.outputs())
+
+    def outputs(self):
+        # the export in every format (the long gamma tables are not checked)
+        base = os.path.splitext(self.output)[0]
+        return [f"{base}.{export_format}" for export_format in self.formats]
+
+    def mark_done(self, seconds):
+        os.makedirs(os.path.dirname(self.marker_path()), exist_ok=True)
+        with open(self.marker_path(), "w", encoding="utf-8") as file:
+            json.dump({"file": self.file, "sheet": self.sheet, "column": self.column, "topics": self.topics,
+                       "engine": self.engine, "output": self.output, "seconds": round(seconds, 1),
+                       "finished": datetime.datetime.now().isoformat(timespec="seconds")}, file, indent=2)
+
+    def describe(self):
+        sheet = f"[{self.sheet}]" if self.sheet else ""
+        return f"{os.path.basename(self.file)}{sheet} {self.column} (k={self.topics}, {self.engine})"
+
+
+def _init_process(rscript):
+    global _rscript
+    _rscript = rscript
+
+
+def _run_r(job):
+    global _r_pool
+    from tm_worker import RWorkerPool
+
+    if _r_pool is None:
+        _r_pool = RWorkerPool(_rscript, size=1)
+
+    # model and column files in the app's cache, see get_model_cache / get_input_file
+    model_cache = ArtifactCache(os.path.join(job.cache_dir, "models"), max_entries=config["model_cache_entries"])
+    column_cache = ArtifactCache(os.path.join(job.cache_dir, "columns"),
+                                 max_entries=config["column_cache_entries"], suffix=".feather")
+    column = column_key(file_sha256(job.file), job.sheet, job.column)
+    if not column_cache.touch(column):
+        get_workbook(job.file).write_column(job.sheet, job.column, column_cache.path_for(column))
+    model = job.model_key()
+    model_cache.touch(model)
+    # lemmatized tokens of the column, shared with the app (see get_token_file)
+    token_cache = ArtifactCache(os.path.join(job.cache_dir, "tokens"), max_entries=config["token_cache_entries"])
+    tokens = dataset_key(file_sha256(job.file), job.sheet, job.column, config)
+    token_cache.touch(tokens)
+
+    script_args = [
+        os.path.dirname(job.file), os.path.basename(job.file), job.sheet, job.column, str(job.topics),
+        job.filter_words,
+        f"--artifact_file={model_cache.path_for(model)}",
+        *pipeline_args(config),
+        "--cores=1",  # the pool already runs one job per core
+        f"--language_cache_dir={os.path.join(job.cache_dir, 'languages')}",
+        f"--input_file={column_cache.path_for(column)}",
+        f"--output_file={job.output}",
+        f"--token_file={token_cache.path_for(tokens)}",
+        f"--export_formats={','.join(job.formats)}",
+        f"--long_gamma={str(job.long_gamma).lower()}",
+    ]
+    result = _r_pool.run(os.path.join(SCRIPT_DIR, config["export_script"]), script_args)
+    stages = [event["stage"] for event in map(parse_event, result.stderr.splitlines()) if event]
+    # the export script catches its own errors and prints them to stdout
+    if result.returncode != 0 or config["export_done_marker"] not in stages:
+        message = result.stdout.strip() or result.stderr.strip()
+        raise RuntimeError(message.splitlines()[-1] if message else f"exit code {result.returncode}")
+
+
+def _run_python(job):
+    import tm_engine
+    from tm_export import long_gamma_table, write_exports
+
+    filter_words = []
+    if job.filter_words and os.path.exists(job.filter_words):
+        with open(job.filter_words, "r") as file:
+            filter_words = [w.strip().lower() for w in file.read().splitlines() if w.strip()]
+    df = get_workbook(job.file).column(job.sheet, job.column).to_frame()
+    # one core per job, the pool already runs jobs side by side
+    analysis = tm_engine.run_analysis(df, job.column, job.topics, filter_words, n_jobs=1,
+                                      language=config["language"], dedup=config["dedup_responses"], pruning=pruning_options(config),
+                                      seeds=seeds(config), selection=config["fit_selection"])
+    long_gamma = long_gamma_table(analysis["gamma"], analysis["data_selection"]) if job.long_gamma else None
+    write_exports(analysis["table"], job.output, job.formats, long_gamma)
+
+
+def run_job(job):
+    # runs inside a pool process; returns (ok, seconds, error message)
+    started = time.perf_counter()
+    try:
+        if job.engine == "Python":
+            _run_python(job)
+        else:
+            _run_r(job)
+    except Exception as e:
+        return False, time.perf_counter() - started, str(e)
+    return True, time.perf_counter() - started, ""
+
+
+def expand_jobs(entries, base_dir="."):
+    # manifest entries -> BatchJobs, one per sheet and column
+    jobs = []
+    for entry in entries:
+        paths = sorted(glob.glob(os.path.join(base_dir, entry["file"]))) or [os.path.join(base_dir, entry["file"])]
+        # exports written next to the workbooks match the same patterns
+        paths = [p for p in paths if not os.path.basename(p).startswith(OUTPUT_PREFIX)]
+        filter_words = entry.get("filter_words")
+        if filter_words:
+            filter_words = os.path.join(base_dir, filter_words)
+        for path in paths:
+            workbook = get_workbook(os.path.abspath(path))
+            sheets = [entry["sheet"]] if entry.get("sheet") else workbook.sheet_names
+            columns = entry.get("columns") or ([entry["column"]] if entry.get("column") else None)
+            sheet_columns = [(sheet, columns or open_text_columns(workbook, sheet)) for sheet in sheets]
+
+            # several sheets with the same column name would overwrite each other's export
+            seen = {}
+            for sheet, names in sheet_columns:
+                for name in names:
+                    seen[name] = seen.get(name, 0) + 1
+            for sheet, names in sheet_columns:
+                for name in names:
+                    output = os.path.join(os.path.dirname(workbook.path),
+                                          output_name(name, sheet if seen[name] > 1 else None))
+                    jobs.append(BatchJob(workbook.path, sheet, name, entry.get("topics", config["default_topics"]),
+                                         filter_words, entry.get("engine", config["default_engine"]), output,
+                                         entry.get("formats"), entry.get("long_gamma", False)))
+    return jobs
+
+
+def read_manifest(path):
+    with open(path, encoding="utf-8") as file:
+        manifest = json.load(file)
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+    defaults = manifest.get("defaults", {})
+    return [dict(defaults, **entry) for entry in manifest.get("jobs", [])]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run topic model exports over many workbooks without the UI.")
+    parser.add_argument("files", nargs="*", help="workbooks or glob patterns")
+    parser.add_argument("--manifest", help="json file with jobs (see tm_batch.py)")
+    parser.add_argument("--sheet", help="sheet to use (default: all sheets)")
+    parser.add_argument("--columns", help="comma separated column names (default: all open-text columns)")
+    parser.add_argument("--topics", type=int, default=config["default_topics"], help="number of topics")
+    parser.add_argument("--filter-words", help="file with filter words, one per line")
+    parser.add_argument("--engine", choices=["R", "Python"], default=config["default_engine"])
+    parser.add_argument("--jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="number of jobs run side by side")
+    parser.add_argument("--formats", help="comma separated export formats: xlsx, csv, parquet (default: xlsx)")
+    parser.add_argument("--long-gamma", action="store_true",
+                        help="also write the long response/topic/gamma table")
+    parser.add_argument("--rscript", help="path to Rscript (default: registry on windows, PATH elsewhere)")
+    parser.add_argument("--force", action="store_true", help="also run jobs whose inputs are unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="only list the jobs")
+    args = parser.parse_args(argv)
+    if not args.files and not args.manifest:
+        parser.error("give workbooks or --manifest")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    entries = []
+    base_dir = "."
+    if args.manifest:
+        entries = read_manifest(args.manifest)
+        base_dir = os.path.dirname(os.path.abspath(args.manifest))
+    for pattern in args.files:
+        entries.append({"file": os.path.abspath(pattern), "sheet": args.sheet, "topics": args.topics,
+                        "filter_words": args.filter_words and os.path.abspath(args.filter_words),
+                        "engine": args.engine,
+                        "formats": [f.strip() for f in args.formats.split(",")] if args.formats else None,
+                        "long_gamma": args.long_gamma,
+                        "columns": [c.strip() for c in args.columns.split(",")] if args.columns else None})
+
+    jobs = expand_jobs(entries, base_dir)
+    pending = [job for job in jobs if args.force or not job.is_done()]
+    print(f"{len(jobs)} jobs, {len(jobs) - len(pending)} unchanged and skipped")
+    if args.dry_run:
+        for job in jobs:
+            print(("run   " if job in pending else "skip  ") + job.describe())
+        return 0
+    if not pending:
+        return 0
+
+    rscript = None
+    if any(job.engine == "R" for job in pending):
+        from tm_worker import find_rscript
+        rscript = args.rscript or find_rscript()
+
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, args.jobs), initializer=_init_process,
+                                                initargs=(rscript,)) as executor:
+        futures = {executor.submit(run_job, job): job for job in pending}
+        for future in concurrent.futures.as_completed(futures):
+            job = futures[future]
+            ok, seconds, error = future.result()
+            if ok:
+                job.mark_done(seconds)
+                print(f"done  {seconds:7.1f} s  {job.describe()}")
+            else:
+                failed += 1
+                print(f"FAIL  {seconds:7.1f} s  {job.describe()}: {error}")
+
+    for cache_dir in {job.cache_dir for job in pending}:
+        ArtifactCache(os.path.join(cache_dir, "models"), max_entries=config["model_cache_entries"]).evict()
+        ArtifactCache(os.path.join(cache_dir, "columns"), max_entries=config["column_cache_entries"],
+                      suffix=".feather").evict()
+        ArtifactCache(os.path.join(cache_dir, "tokens"), max_entries=config["token_cache_entries"]).evict()
+
+    print(f"{len(pending) - failed} jobs finished, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
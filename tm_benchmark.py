@@ -0,0 +1,329 @@
+# ---------------------------------------
+# pipeline benchmark
+# ---------------------------------------
+# times every stage of the pipeline on synthetic survey workbooks so changes
+# can be compared between revisions:
+#
+#   python tm_benchmark.py --sizes 1000,10000 --tagger stub
+#   python tm_benchmark.py --compare tm_benchmark_<old revision>.json
+#
+# workbooks with realistic answer lengths, stock answers ("geen", "n.v.t.")
+# and copy-pasted duplicates are generated once and kept in --data-dir.
+# python stages (excel read, select_sheet parse, token index, word cloud,
+# bar chart, sentiment) are timed directly; r stages are taken from the stage
+# events the scripts report while running in an r worker, with cold caches.
+# --tagger stub replaces treetagger so the suite runs offline, --tagger
+# stub-pool runs the tagger pool with tm_stub_tagger.py. results are written
+# as json per size and stage, in seconds.
+#
+# startup is timed once per run in fresh processes: importing the app module,
+# opening the main window (needs a display) and starting an r worker up to
+# the point where its packages are attached.
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from tm_data import FrameCache, TokenIndex, Workbook
+from tm_profile import parse_event
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SHEET_NAME = "Survey"
+COLUMN_NAME = "open_answer"
+
+# r stage event -> benchmark stage
+R_STAGES = {
+    "Data read and preprocessed": "r_read",
+    "Language detected": "language_detection",
+    "Text tokenized": "tokenization",
+    "Tokens lemmatized": "lemmatization",
+    # the dtm is built together with the vocabulary pruning
+    "Vocabulary pruned": "dtm_build",
+    "Optimal number of topics determined": "determine_optimal_topics",
+    "Topic model fitted": "fit_topic_model",
+    "Top terms extracted": "extract_top_terms",
+    "Document-topic probabilities generated and merged with data": "document_topics",
+    "Export written": "write_xlsx",
+}
+
+TOPIC_WORDS = [
+    "wachttijd afspraak lang wachten telefoon bereikbaar snel planning uur week".split(),
+    "arts dokter uitleg behandeling duidelijk vragen luisteren advies onderzoek diagnose".split(),
+    "verpleging verpleegkundige zorg aandacht vriendelijk behulpzaam personeel team hulp warm".split(),
+    "parkeren parkeerplaats auto bereikbaarheid route ingang bord bus duur garage".split(),
+    "eten maaltijd koffie restaurant kantine smaak keuze warm brood prijs".split(),
+    "kamer bed rust lawaai schoon hygiene douche licht temperatuur privacy".split(),
+]
+COMMON_WORDS = ("de het een en van ik is was niet met voor op dat die erg heel goed slecht "
+                "fijn prettig beter meer minder graag echt wel ook zeer").split()
+STOCK_ANSWERS = ["geen", "n.v.t.", "nvt", "nee", "geen opmerkingen", "niets", "weet ik niet", "alles was goed"]
+ENGLISH_ANSWERS = ["the waiting time was far too long", "very friendly staff and good care",
+                   "parking was expensive and hard to find", "the food could be better"]
+
+
+def synthetic_responses(n, seed=1):
+    # open answers: log-normal lengths, a topic mix per answer, ~10% stock answers,
+    # ~5% copies of earlier answers and ~3% english answers
+    rng = np.random.default_rng(seed)
+    lengths = np.clip(rng.lognormal(mean=2.4, sigma=0.8, size=n).astype(int), 1, 300)
+    kinds = rng.random(n)
+    responses = []
+    for i in range(n):
+        if kinds[i] < 0.10:
+            responses.append(STOCK_ANSWERS[rng.integers(len(STOCK_ANSWERS))])
+        elif kinds[i] < 0.15 and responses:
+            responses.append(responses[rng.integers(len(responses))])
+        elif kinds[i] < 0.18:
+            responses.append(ENGLISH_ANSWERS[rng.integers(len(ENGLISH_ANSWERS))])
+        else:
+            topics = rng.choice(len(TOPIC_WORDS), size=2, replace=False)
+            words = []
+            for _ in range(lengths[i]):
+                pick = rng.random()
+                source = TOPIC_WORDS[topics[0]] if pick < 0.45 else TOPIC_WORDS[topics[1]] if pick < 0.65 else COMMON_WORDS
+                words.append(source[rng.integers(len(source))])
+            responses.append(" ".join(words).capitalize() + ".")
+    return responses
+
+
+def synthetic_workbook(n, data_dir, seed=1):
+    # survey workbook with an id, a score and an open answer column; generated once per size and seed
+    path = os.path.join(data_dir, f"synthetic_survey_{n}_{seed}.xlsx")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        rng = np.random.default_rng(seed + 1)
+        df = pd.DataFrame({
+            "respondent": np.arange(1, n + 1),
+            "score": rng.integers(1, 11, size=n),
+            COLUMN_NAME: synthetic_responses(n, seed),
+        })
+        tmp_path = path + ".tmp.xlsx"
+        df.to_excel(tmp_path, sheet_name=SHEET_NAME, index=False)
+        os.replace(tmp_path, path)
+    return path
+
+
+def timed(timings, stage, func, *args, **kwargs):
+    started = time.perf_counter()
+    value = func(*args, **kwargs)
+    timings[stage] = time.perf_counter() - started
+    return value
+
+
+def stage_seconds(stderr, stages):
+    # seconds per benchmark stage from the TM_EVENT lines of an r job
+    timings = {}
+    for event in map(parse_event, stderr.splitlines()):
+        if event and event["stage"] in stages:
+            timings[stages[event["stage"]]] = event["seconds"]
+    return timings
+
+
+def benchmark_python(path, topics):
+    # stages that run in the app's python process
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from tm_charts import top_terms_figure, wordcloud_image
+
+    timings = {}
+    timed(timings, "excel_read", pd.read_excel, path, sheet_name=SHEET_NAME)
+
+    def select_sheet():
+        workbook = Workbook(path, FrameCache(1024 ** 3))
+        workbook.columns(SHEET_NAME)
+        return workbook.column(SHEET_NAME, COLUMN_NAME)
+    column = timed(timings, "select_sheet", select_sheet)
+
+    texts = column.dropna().astype(str).tolist()
+    index = timed(timings, "token_index", TokenIndex, texts)
+    timed(timings, "wordcloud", wordcloud_image, index, frozenset(), 800, 400, 200)
+
+    # bar chart of k topics with 20 terms each, as drawn after an analysis run
+    words = [w for w, _ in index.top_words(set(), topics * 20)]
+    top_terms = pd.DataFrame({"topic": [i // 20 + 1 for i in range(len(words))], "term": words,
+                              "beta": np.linspace(0.05, 0.001, len(words))})
+
+    def bar_chart():
+        fig = top_terms_figure(top_terms, "viridis")
+        fig.canvas.draw()
+        plt.close(fig)
+    timed(timings, "bar_chart", bar_chart)
+
+    # sentiment with a cold score cache: from the word cloud's tokens, and tokenized in batches
+    from tm_sentiment import score_column
+    with tempfile.TemporaryDirectory(prefix="tm_benchmark_") as cache_dir:
+        timed(timings, "sentiment_from_index", score_column, column, "nl", cache_dir, index=index)
+    with tempfile.TemporaryDirectory(prefix="tm_benchmark_") as cache_dir:
+        timed(timings, "sentiment", score_column, column, "nl", cache_dir)
+        timed(timings, "sentiment_cached", score_column, column, "nl", cache_dir)
+    return timings, column
+
+
+def benchmark_python_engine(column, topics):
+    import tm_engine
+
+    timings = {}
+    data = timed(timings, "py_select_responses", tm_engine.select_responses, column.to_frame(), COLUMN_NAME)
+    dtm, _ = timed(timings, "py_dtm_build", tm_engine.build_dtm, data[COLUMN_NAME],
+                   stopwords=tm_engine.stopwords_for("nl"))
+    dtm = dtm[np.flatnonzero(dtm.getnnz(axis=1))]
+    timed(timings, "py_fit_lda", tm_engine.fit_lda, dtm, topics)
+    return timings
+
+
+def benchmark_r(pool, path, workbook, topics, tagger, work_dir):
+    # analysis script (with tuning sweep) then export script, cold caches in work_dir
+    input_file = os.path.join(work_dir, "column.feather")
+    workbook.write_column(SHEET_NAME, COLUMN_NAME, input_file)
+    artifact_file = os.path.join(work_dir, "model.rds")
+    common = [
+        f"--artifact_file={artifact_file}",
+        f"--lemma_cache_dir={os.path.join(work_dir, 'lemmas')}",
+        f"--language_cache_dir={os.path.join(work_dir, 'languages')}",
+        f"--input_file={input_file}",
+        f"--tagger={tagger}",
+    ]
+    if tagger == "stub-pool":
+        # the pool code path without treetagger
+        common[-1] = "--tagger=pool"
+        common.append(f"--tagger_command={json.dumps([sys.executable, os.path.join(SCRIPT_DIR, 'tm_stub_tagger.py')])}")
+    positional = [os.path.dirname(path), os.path.basename(path), SHEET_NAME, COLUMN_NAME, str(topics),
+                  os.path.join(work_dir, "no_filter_words.txt")]
+
+    timings = {}
+    for script, extra in [("TM Single file Viz.R", ["--tuning=always", f"--result_dir={os.path.join(work_dir, 'run')}",
+                                                    f"--tuning_cache_dir={os.path.join(work_dir, 'tuning')}"]),
+                          ("TM Single file Export.R", [f"--output_file={os.path.join(work_dir, 'export.xlsx')}"])]:
+        result = pool.run(os.path.join(SCRIPT_DIR, script), positional + common + extra)
+        if result.returncode != 0:
+            raise RuntimeError(f"{script} failed:\n{result.stderr[-2000:]}")
+        # the export reuses the fitted model, only its own stages are new
+        for stage, seconds in stage_seconds(result.stderr, R_STAGES).items():
+            timings.setdefault(stage, seconds)
+    return timings
+
+
+def benchmark_startup():
+    # seconds from a fresh python process to the imported app / shown window
+    timings = {}
+    code = ("import time; started = time.perf_counter(); import topic_modeling_app; "
+            "print(time.perf_counter() - started)")
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=SCRIPT_DIR, text=True)
+    timings["app_import"] = float(output.strip().splitlines()[-1])
+    if os.name == "nt" or os.environ.get("DISPLAY"):
+        # --startup-check logs the startup event to stdout, seconds since process start
+        output = subprocess.check_output([sys.executable, "topic_modeling_app.py", "--startup-check"],
+                                         cwd=SCRIPT_DIR, text=True)
+        for line in output.splitlines():
+            if line.rstrip().endswith("Window shown"):
+                timings["time_to_window"] = float(line.split()[0])
+    return timings
+
+
+def revision():
+    try:
+        rev = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR,
+                                      stderr=subprocess.DEVNULL, text=True).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=SCRIPT_DIR,
+                                        stderr=subprocess.DEVNULL, text=True).strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline):
+    # per size and stage: baseline seconds, new seconds and the ratio
+    print(f"{'size':>8}  {'stage':<26} {'baseline':>9} {'now':>9} {'ratio':>7}")
+    sizes = dict(results["sizes"], startup=results.get("startup", {}))
+    for size, stages in sizes.items():
+        old_stages = baseline.get("startup", {}) if size == "startup" else baseline.get("sizes", {}).get(size, {})
+        for stage, seconds in stages.items():
+            old = old_stages.get(stage)
+            ratio = f"{seconds / old:6.2f}x" if old else ""
+            old_text = f"{old:9.2f}" if old is not None else f"{'-':>9}"
+            print(f"{size:>8}  {stage:<26} {old_text} {seconds:9.2f} {ratio:>7}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic survey workbooks.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated numbers of responses")
+    parser.add_argument("--topics", type=int, default=5)
+    parser.add_argument("--tagger", choices=["treetagger", "pool", "stub", "stub-pool"], default="stub")
+    parser.add_argument("--skip-r", action="store_true", help="only time the python stages")
+    parser.add_argument("--python-engine", action="store_true", help="also time the python engine (tm_engine.py)")
+    parser.add_argument("--rscript", help="path to Rscript (default: registry on windows, PATH elsewhere)")
+    parser.add_argument("--data-dir", default=os.path.join(SCRIPT_DIR, "benchmark_data"),
+                        help="where the synthetic workbooks are kept")
+    parser.add_argument("--output", help="result file (default: tm_benchmark_<revision>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare with")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    rev = revision()
+
+    startup = benchmark_startup()
+    pool = None
+    if not args.skip_r:
+        from tm_worker import RWorkerPool, find_rscript
+        try:
+            pool = RWorkerPool(args.rscript or find_rscript(), size=1)
+            # package loading is not part of any stage, only of the startup
+            timed(startup, "r_worker_start", pool.workers[0].start)
+        except (OSError, RuntimeError) as e:
+            print(f"R stages skipped: {e}", file=sys.stderr)
+            pool = None
+
+    results = {
+        "revision": rev,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "tagger": args.tagger,
+        "topics": args.topics,
+        "startup": {stage: round(seconds, 4) for stage, seconds in startup.items()},
+        "sizes": {},
+    }
+    print("startup: " + ", ".join(f"{s} {t:.2f}s" for s, t in startup.items()))
+    try:
+        for size in sizes:
+            path = synthetic_workbook(size, args.data_dir)
+            timings, column = benchmark_python(path, args.topics)
+            if args.python_engine:
+                timings.update(benchmark_python_engine(column, args.topics))
+            if pool is not None:
+                with tempfile.TemporaryDirectory(prefix="tm_benchmark_") as work_dir:
+                    workbook = Workbook(path, FrameCache(1024 ** 3))
+                    timings.update(benchmark_r(pool, path, workbook, args.topics, args.tagger, work_dir))
+            results["sizes"][str(size)] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
+            print(f"{size:>8} responses: " + ", ".join(f"{s} {t:.2f}s" for s, t in timings.items()))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    output = args.output or f"tm_benchmark_{rev}.json"
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            compare(results, json.load(file))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
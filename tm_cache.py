@@ -0,0 +1,99 @@
+# ---------------------------------------
+# on-disk caches shared by the app and the r scripts
+# ---------------------------------------
+# cache entries are plain files inside a directory next to the workbook;
+# the r scripts read and write them directly, python decides the keys and
+# keeps the directory bounded (least recently used entries are removed).
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+
+
+_file_hashes = {}  # (path, size, mtime) -> sha256, avoids rehashing big workbooks
+
+
+def file_sha256(path):
+    # content hash of a file, memoised on size and modification time
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+
+def filter_words_sha256(path):
+    # hash of the filter words in a file, ignoring order, duplicates and blank lines
+    words = []
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            words = sorted({w.strip() for w in file.read().splitlines() if w.strip()})
+    return hashlib.sha256("\n".join(words).encode("utf-8")).hexdigest()
+
+
+@contextlib.contextmanager
+def replaced_atomically(path):
+    # yields a temp file of its own next to path and moves it in place when the
+    # block succeeds, so threads or processes writing the same entry at the same
+    # time never share a temp file and readers never see a half-written one
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def make_key(*parts):
+    # stable key for any json-serialisable combination of inputs
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ArtifactCache:
+    # directory of cache files with least-recently-used eviction
+    def __init__(self, directory, max_entries=10, suffix=".rds"):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.suffix = suffix
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def contains(self, key):
+        return os.path.exists(self.path_for(key))
+
+    def touch(self, key):
+        # mark an entry as recently used
+        path = self.path_for(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return True
+        return False
+
+    def entries(self):
+        # cache files, least recently used first
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith(self.suffix)]
+        return sorted(paths, key=os.path.getmtime)
+
+    def evict(self):
+        # drop least recently used entries above the limit
+        entries = self.entries()
+        removed = []
+        for path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+                removed.append(path)
+            except OSError:
+                pass
+        return removed
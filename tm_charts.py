@@ -0,0 +1,66 @@
+# ---------------------------------------
+# charts
+# ---------------------------------------
+# figures and images shown by the app, built without tk widgets so the
+# benchmark (tm_benchmark.py) times the same drawing code as the ui.
+
+import matplotlib.pyplot as plt
+import seaborn as sns
+from wordcloud import WordCloud, STOPWORDS
+
+
+def tuning_metrics_figure(tuning_df):
+    # same picture as ldatuning::FindTopicsNumber_plot: each metric scaled to 0..1
+    groups = [("minimize", ["Arun2010", "CaoJuan2009"]), ("maximize", ["Deveaud2014", "Griffiths2004"])]
+    fig, axes = plt.subplots(nrows=2, ncols=1, figsize=(7, 6), sharex=True)
+    for ax, (title, metrics) in zip(axes, groups):
+        for metric in metrics:
+            if metric not in tuning_df:
+                continue
+            values = tuning_df[metric].astype(float)
+            spread = values.max() - values.min()
+            scaled = (values - values.min()) / spread if spread else values * 0
+            ax.plot(tuning_df["topics"], scaled, marker='o', label=metric)
+        ax.set_title(title)
+        ax.legend()
+    axes[-1].set_xlabel("number of topics")
+
+    plt.tight_layout()
+    return fig
+
+
+def top_terms_figure(top_terms_df, palette):
+    # bar chart of top terms, two topics per row
+    topics = sorted(top_terms_df['topic'].unique())
+    num_topics = len(topics)
+    num_cols = 2
+    num_rows = (num_topics + num_cols - 1) // num_cols
+
+    fig, axes = plt.subplots(nrows=num_rows, ncols=num_cols, figsize=(12, 4 * num_rows))
+    axes = axes.flatten()
+    colors = sns.color_palette(palette, num_topics)
+
+    for idx, topic in enumerate(topics):
+        ax = axes[idx]
+        topic_terms = top_terms_df[top_terms_df['topic'] == topic].copy()
+        topic_terms = topic_terms.sort_values('beta', ascending=False)
+        color = colors[idx % len(colors)]
+        sns.barplot(data=topic_terms, x='beta', y='term', ax=ax, color=color)
+        ax.set_title(f'Topic {topic}')
+        ax.set_xlabel('Beta')
+        ax.set_ylabel('Term')
+        ax.tick_params(axis='y', labelsize=10)
+
+    for idx in range(len(topics), len(axes)):
+        fig.delaxes(axes[idx])
+
+    plt.tight_layout()
+    return fig
+
+
+def wordcloud_image(index, filter_words, width, height, max_words):
+    # word cloud of a TokenIndex as a PIL image; WordCloud.generate drops its english stopwords too
+    frequencies = dict(index.top_words(set(filter_words) | STOPWORDS, max_words))
+    wordcloud = WordCloud(width=width, height=height, background_color='white',
+                          max_words=max_words).generate_from_frequencies(frequencies)
+    return wordcloud.to_image()
@@ -0,0 +1,115 @@
+# ---------------------------------------
+# pipeline settings shared by the app, the service and the batch cli
+# ---------------------------------------
+# the settings that decide what a model, a token file or an export looks
+# like, and the cache keys and r script options built from them. the app
+# (topic_modeling_app.py), the analysis service (tm_service.py) and the batch
+# cli (tm_batch.py) start their config from PIPELINE_CONFIG and build every
+# key here, so the three of them read and write the same .tm_cache entries.
+
+import json
+import os
+
+from tm_cache import filter_words_sha256, make_key
+
+
+PIPELINE_CONFIG = {
+    # fitted models, column files, lemmatized tokens and tuning metrics are
+    # cached in this directory next to the workbook
+    "cache_dir_name": ".tm_cache",
+    "model_cache_entries": 10,
+    "column_cache_entries": 20,
+    "token_cache_entries": 10,
+    "tuning_cache_entries": 20,
+    # language of the responses kept by the r scripts (cld3 code); detected
+    # languages are cached per response text in .tm_cache/languages
+    "language": "nl",
+    # responses that only differ in case, punctuation or spacing are modeled
+    # once, as one document weighted by the number of copies
+    "dedup_responses": True,
+    # vocabulary limits applied before the dtm is built: words in fewer than
+    # min_docfreq responses or in more than max_docfreq_ratio of them are dropped,
+    # and only the max_vocab most frequent words are kept (0 = no limit). the
+    # defaults keep every word, as before pruning existed; min_docfreq 2 drops the
+    # words of a single response and changes the topics of earlier analyses
+    "min_docfreq": 1,
+    "max_docfreq_ratio": 1.0,
+    "max_vocab": 0,
+    # fit_seeds > 1 fits that many seeds (and every method in fit_methods, "VEM"
+    # and/or "Gibbs"; the python engine only has VEM) in parallel and keeps the
+    # best model by held-out "perplexity" or umass "coherence" (fit_selection)
+    "fit_seeds": 1,
+    "fit_methods": ["VEM"],
+    "fit_selection": "perplexity",
+    # "auto" runs the ldatuning sweep only while the number of topics is 0,
+    # "always" runs it every time, "never" skips it
+    "tuning_sweep": "auto",
+    # lemmatizer of the r scripts: "treetagger" tags through koRpus, one call per run;
+    # "pool" keeps tree-tagger-flush processes running and tags the tokens in parallel
+    # shards, it needs TreeTagger/bin and the parameter file of the language in
+    # TreeTagger/lib (not shipped, falls back to "treetagger" without them); "stub"
+    # keeps every token as it is. tagger_command replaces the bundled
+    # tree-tagger-flush, e.g. [sys.executable, "tm_stub_tagger.py"];
+    # tagger_workers 0 = all cores but one
+    "tagger": "treetagger",
+    "tagger_command": [],
+    "tagger_workers": 0,
+    # token -> lemma cache shared by all workbooks (per language and tagger)
+    "lemma_cache_dir": "~/.tm_cache/lemmas",
+}
+
+PRUNING_KEYS = ("min_docfreq", "max_docfreq_ratio", "max_vocab")
+
+
+def pruning_options(settings):
+    # vocabulary limits, as passed to tm_engine.run_analysis
+    return {name: settings[name] for name in PRUNING_KEYS}
+
+
+def seeds(settings):
+    # seeds of the multi-seed fit, the same ones on both engines (20, 21, ...)
+    return tuple(range(20, 20 + max(1, settings["fit_seeds"])))
+
+
+def seed_args(settings):
+    # multi-seed fit options for the r scripts (seed_options in "TM Common.R")
+    return [f"--seeds={settings['fit_seeds']}", f"--fit_methods={','.join(settings['fit_methods'])}",
+            f"--selection={settings['fit_selection']}"]
+
+
+def tagger_args(settings):
+    # lemmatizer options for the r scripts
+    args = [f"--tagger={settings['tagger']}", f"--tagger_workers={settings['tagger_workers']}"]
+    if settings["tagger_command"]:
+        args.append(f"--tagger_command={json.dumps(settings['tagger_command'])}")
+    return args
+
+
+def pipeline_args(settings):
+    # r script options every analysis and export run gets from the settings
+    return [
+        f"--lemma_cache_dir={os.path.expanduser(settings['lemma_cache_dir'])}",
+        f"--language={settings['language']}",
+        f"--dedup={str(settings['dedup_responses']).lower()}",
+        *tagger_args(settings),
+        *(f"--{name}={value}" for name, value in pruning_options(settings).items()),
+        *seed_args(settings),
+    ]
+
+
+def column_key(workbook_hash, sheet_name, column_name):
+    # feather file with one column of a workbook (.tm_cache/columns)
+    return make_key(workbook_hash, sheet_name, column_name)
+
+
+def dataset_key(workbook_hash, sheet_name, column_name, settings):
+    # the responses a model is fitted on, whatever the filter words and k;
+    # also the key of the lemmatized tokens (.tm_cache/tokens)
+    return make_key(workbook_hash, sheet_name, column_name, settings["language"], settings["dedup_responses"])
+
+
+def model_key(workbook_hash, sheet_name, column_name, number_of_topics, filter_words_file, settings):
+    # model fitted on a column with these filter words, k and settings (.tm_cache/models)
+    return make_key(workbook_hash, sheet_name, column_name, number_of_topics,
+                    filter_words_sha256(filter_words_file), settings["language"], settings["dedup_responses"],
+                    pruning_options(settings), seed_args(settings), settings["tagger"], settings["tagger_command"])
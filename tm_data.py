@@ -0,0 +1,224 @@
+# ---------------------------------------
+# workbook loading
+# ---------------------------------------
+# the app used to parse a whole sheet to fill the column dropdown and again
+# for every word cloud / filter window refresh. a Workbook reads sheet names
+# and headers only (openpyxl read-only mode) and loads single columns on
+# demand; loaded columns are kept in a FrameCache with a memory limit.
+# a TokenIndex holds the word counts of one column so the filter words
+# window and the word cloud do not re-tokenize the column every time; it also
+# keeps the tokens per response, which the sentiment scores reuse.
+# pandas/numpy are imported on first use, so importing this module is cheap.
+
+import heapq
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from operator import itemgetter
+
+from tm_cache import replaced_atomically
+
+
+class FrameCache:
+    # lru cache of dataframes/series, bounded by their (deep) memory usage
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def size_of(value):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value):
+        size = self.size_of(value)
+        with self._lock:
+            if key in self._items:
+                self.total_bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.total_bytes += size
+            # always keep the newest entry, even if it is larger than the limit on its own
+            while self.total_bytes > self.max_bytes and len(self._items) > 1:
+                _, (_, old_size) = self._items.popitem(last=False)
+                self.total_bytes -= old_size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.total_bytes = 0
+
+
+def _mangle_headers(header):
+    # same column names pandas would give: "Unnamed: i" for blanks, ".1" suffixes for duplicates
+    names = []
+    seen = {}
+    for idx, name in enumerate(header):
+        name = f"Unnamed: {idx}" if name is None or (isinstance(name, str) and not name.strip()) else name
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+class Workbook:
+    # sheet names, headers and single columns of an excel file, loaded lazily
+    def __init__(self, path, cache):
+        self.path = path
+        self.cache = cache
+        self.is_xlsx = os.path.splitext(path)[1].lower() != ".xls"
+        stat = os.stat(path)
+        self._version = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        self._headers = {}
+
+        if self.is_xlsx:
+            workbook = self._open()
+            self.sheet_names = list(workbook.sheetnames)
+            workbook.close()
+        else:
+            import pandas as pd
+            self.sheet_names = pd.ExcelFile(path).sheet_names
+
+    def _open(self):
+        import openpyxl
+        return openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+
+    def resolve_sheet(self, sheet_name):
+        # empty sheet name means the first sheet, like pandas' default
+        return sheet_name if sheet_name else self.sheet_names[0]
+
+    def columns(self, sheet_name):
+        # column names from the header row only
+        sheet_name = self.resolve_sheet(sheet_name)
+        if sheet_name not in self._headers:
+            if self.is_xlsx:
+                workbook = self._open()
+                try:
+                    header = next(workbook[sheet_name].iter_rows(min_row=1, max_row=1, values_only=True), ())
+                finally:
+                    workbook.close()
+                header = list(header)
+                while header and header[-1] is None:
+                    header.pop()
+                self._headers[sheet_name] = _mangle_headers(header)
+            else:
+                import pandas as pd
+                self._headers[sheet_name] = list(pd.read_excel(self.path, sheet_name=sheet_name, nrows=0).columns)
+        return self._headers[sheet_name]
+
+    def column(self, sheet_name, column_name):
+        # one column as a series (header excluded), cached
+        import pandas as pd
+
+        sheet_name = self.resolve_sheet(sheet_name)
+        key = (self._version, sheet_name, column_name)
+        series = self.cache.get(key)
+        if series is not None:
+            return series
+
+        # the dropdown hands back strings, headers can also be numbers or dates
+        names = self.columns(sheet_name)
+        position = names.index(column_name) if column_name in names else [str(n) for n in names].index(str(column_name))
+        if self.is_xlsx:
+            workbook = self._open()
+            try:
+                rows = workbook[sheet_name].iter_rows(min_row=2, min_col=position + 1, max_col=position + 1,
+                                                      values_only=True)
+                values = [row[0] if row else None for row in rows]
+            finally:
+                workbook.close()
+            # read-only mode also yields trailing empty rows, pandas drops those
+            while values and values[-1] is None:
+                values.pop()
+            series = pd.Series(values, name=column_name, dtype=object)
+        else:
+            series = pd.read_excel(self.path, sheet_name=sheet_name, usecols=[position]).iloc[:, 0]
+            series.name = column_name
+
+        self.cache.put(key, series)
+        return series
+
+    def write_column(self, sheet_name, column_name, path):
+        # one column plus a 1-based row_id as uncompressed feather, the input of the r scripts
+        import numpy as np
+        import pandas as pd
+        import pyarrow.feather as feather
+
+        series = self.column(sheet_name, column_name)
+        frame = pd.DataFrame({"row_id": np.arange(1, len(series) + 1),
+                              str(column_name): series.astype("string").to_numpy()})
+        with replaced_atomically(path) as tmp_path:
+            feather.write_feather(frame, tmp_path, compression="uncompressed")
+
+
+# words plus the separator between responses (excel cells cannot hold a nul)
+RESPONSE_SEPARATOR = "\x00"
+TOKEN_PATTERN = re.compile(r'\w+|\x00')
+
+
+def tokenize_responses(texts):
+    # all responses in one regex pass: word codes in response order, code 0
+    # after every response, and the word of every code (vocab[0] is the separator)
+    import numpy as np
+
+    joined = RESPONSE_SEPARATOR.join(texts) + RESPONSE_SEPARATOR if len(texts) else ""
+    words = TOKEN_PATTERN.findall(joined.lower())
+    vocab = {RESPONSE_SEPARATOR: 0}
+    codes = np.array([vocab.setdefault(w, len(vocab)) for w in words], dtype=np.int32)
+    return codes, list(vocab)
+
+
+class TokenIndex:
+    # word counts of one column, built once from the tokens of every response
+    def __init__(self, texts):
+        import numpy as np
+
+        self.codes, self.vocab = tokenize_responses(texts)
+        counts = np.bincount(self.codes, minlength=len(self.vocab))
+        self.counts = Counter(dict(zip(self.vocab[1:], counts[1:].tolist())))
+        self.document_count = len(texts)
+
+    def top_words(self, excluded, n):
+        # n most frequent words that are not in the excluded set
+        candidates = ((w, c) for w, c in self.counts.items() if w not in excluded)
+        return heapq.nlargest(n, candidates, key=itemgetter(1))
+
+    def frequencies(self, excluded):
+        # word -> count without the excluded words
+        return {w: c for w, c in self.counts.items() if w not in excluded}
+
+
+class TopWords:
+    # the n most frequent words of an index minus a growing set of excluded words.
+    # words come off a heap in frequency order, so excluding a word only pops
+    # the next candidate instead of recounting the column
+    def __init__(self, index, excluded, n):
+        self.n = n
+        self.excluded = set(excluded)
+        self.shown = []
+        self._heap = [(-c, w) for w, c in index.counts.items()]
+        heapq.heapify(self._heap)
+        self._fill()
+
+    def _fill(self):
+        while len(self.shown) < self.n and self._heap:
+            count, word = heapq.heappop(self._heap)
+            if word not in self.excluded:
+                self.shown.append((word, -count))
+
+    def exclude(self, words):
+        self.excluded.update(words)
+        self.shown = [(w, c) for w, c in self.shown if w not in self.excluded]
+        self._fill()
@@ -0,0 +1,373 @@
+# ---------------------------------------
+# in-process python topic modeling engine
+# ---------------------------------------
+# alternative to the r scripts for quick iterations: the selected column is
+# tokenized straight into a scipy sparse document-term matrix and lda is
+# fitted with scikit-learn's (multi-core) variational bayes.
+# the results use the same shapes as the r side:
+#   top terms: topic, term, beta         (tidy(model, matrix = "beta"))
+#   gamma:     document, topic, gamma    (tidy(model, matrix = "gamma"))
+# there is no treetagger lemmatization and no language detection here; the
+# stopwords are those of the configured language, like in the r scripts.
+# the unfiltered matrix of a column is kept between iterations (prepare_corpus),
+# so a run with other filter words only drops columns, and a fit with the same
+# number of topics continues from the previous model (warm_start_lda).
+# duplicate responses (same text up to case, punctuation and spacing) are one
+# row of the matrix; the fit counts that row once per copy, like the r scripts.
+
+import copy
+import traceback
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.special import psi
+from sklearn.decomposition import LatentDirichletAllocation
+from sklearn.feature_extraction.text import CountVectorizer
+
+
+# same list as tm::stopwords("nl") (snowball)
+DUTCH_STOPWORDS = frozenset("""
+de en van ik te dat die in een hij het niet zijn is was op aan met als voor had er maar om
+hem dan zou of wat mijn men dit zo door over ze zich bij ook tot je mij uit der daar haar naar
+heb hoe heeft hebben deze u want nog zal me zij nu ge geen omdat iets worden toch al waren veel
+meer doen toen moet ben zonder kan hun dus alles onder ja eens hier wie werd altijd doch wordt
+wezen kunnen ons zelf tegen na reeds wil kon niets uw iemand geweest andere
+""".split())
+
+# same list as tm::stopwords("en") (snowball) without the contractions ("don't",
+# "i'm", ...), which TOKEN_PATTERN never produces as one token
+ENGLISH_STOPWORDS = frozenset("""
+i me my myself we our ours ourselves you your yours yourself yourselves he him his himself she her
+hers herself it its itself they them their theirs themselves what which who whom this that these
+those am is are was were be been being have has had having do does did doing would should could
+ought cannot a an the and but if or because as until while of at by for with about against between
+into through during before after above below to from up down in out on off over under again further
+then once here there when where why how all any both each few more most other some such no nor not
+only own same so than too very
+""".split())
+
+# stopwords per language (cld3 code, as "language" in the config)
+STOPWORDS = {"nl": DUTCH_STOPWORDS, "en": ENGLISH_STOPWORDS}
+
+# letters only; tokens with digits are dropped like in the r scripts
+TOKEN_PATTERN = r"(?u)\b[^\W\d_]+\b"
+TOP_TERMS_PER_TOPIC = 20
+WARM_START_PASSES = 3  # online passes over the corpus when continuing an earlier fit
+
+
+class EngineCancelled(Exception):
+    pass
+
+
+class EngineJob:
+    # handle for a background engine run; cancel() stops at the next stage
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise EngineCancelled()
+
+
+class EngineResult:
+    # mirrors RJobResult so the app can treat both engines alike
+    def __init__(self, returncode, value=None, stderr="", cancelled=False):
+        self.returncode = returncode
+        self.value = value
+        self.stdout = ""
+        self.stderr = stderr
+        self.cancelled = cancelled
+
+
+def select_responses(df, column_name):
+    # same row filter as read_and_preprocess_data: drop missing, "-" and very short answers
+    texts = df[column_name].astype("string")
+    keep = texts.notna() & (texts != "") & (texts != "-") & (texts.str.len() >= 5)
+    data = pd.DataFrame({column_name: texts[keep].astype(str)})
+    data["resp_len"] = data[column_name].str.count(r"\w+")
+    data["id"] = np.arange(1, len(data) + 1)
+    data["row_id"] = np.flatnonzero(keep.to_numpy(dtype=bool, na_value=False)) + 1  # row of the column, like the r input
+    data = data.reset_index(drop=True)
+    data["doc_id"] = duplicate_ids(data[column_name], data["id"])
+    return data
+
+
+def normalize_responses(texts):
+    # same as normalize_response in "TM Common.R"
+    return (texts.str.lower().str.replace(r"[^\w\s]+", "", regex=True)
+            .str.replace(r"\s+", " ", regex=True).str.strip())
+
+
+def duplicate_ids(texts, ids):
+    # id of the first response with the same normalized text
+    keys = normalize_responses(texts)
+    first = pd.Series(ids.to_numpy()).groupby(keys.to_numpy(), sort=False).transform("first")
+    return first.to_numpy()
+
+
+def stopwords_for(language):
+    # stopword list of a language; ValueError when the engine has none for it
+    if language not in STOPWORDS:
+        raise ValueError(f"no stopword list for language '{language}' (available: {', '.join(STOPWORDS)})")
+    return STOPWORDS[language]
+
+
+def build_dtm(texts, filter_words=(), stopwords=()):
+    # sparse document-term matrix (csr) and its vocabulary
+    excluded = set(stopwords) | {w.lower() for w in filter_words}
+    vectorizer = CountVectorizer(lowercase=True, token_pattern=TOKEN_PATTERN,
+                                 stop_words=sorted(excluded) or None)
+    dtm = vectorizer.fit_transform(texts)
+    return dtm.tocsr(), vectorizer.get_feature_names_out()
+
+
+def prepare_corpus(df, column_name, language="nl", dedup=True):
+    # responses of a column and the document-term matrix of their unique texts without filter words
+    # and the stopwords of the language. weights = number of responses per document (all 1 without dedup)
+    data_selection = select_responses(df, column_name)
+    if not dedup:
+        data_selection["doc_id"] = data_selection["id"]
+    documents = data_selection[data_selection["doc_id"] == data_selection["id"]]
+    dtm, vocab = build_dtm(documents[column_name], stopwords=stopwords_for(language))
+    weights = data_selection["doc_id"].value_counts().reindex(documents["id"]).to_numpy()
+    return {"data_selection": data_selection, "dtm": dtm, "vocab": vocab,
+            "document_ids": documents["id"].to_numpy(), "weights": weights}
+
+
+def filter_corpus(corpus, filter_words):
+    # drop the columns of the filter words and the documents left empty
+    excluded = {w.lower() for w in filter_words}
+    keep = np.array([term not in excluded for term in corpus["vocab"]], dtype=bool)
+    dtm = corpus["dtm"][:, np.flatnonzero(keep)]
+    non_empty = np.flatnonzero(dtm.getnnz(axis=1))
+    return dtm[non_empty], corpus["vocab"][keep], corpus["document_ids"][non_empty], corpus["weights"][non_empty]
+
+
+def prune_vocabulary(dtm, vocab, weights, min_docfreq=1, max_docfreq_ratio=1.0, max_vocab=0):
+    # same limits as build_dfm in "TM Common.R": document frequency counts every
+    # duplicate response; max_vocab keeps the most frequent words (0 = no limit)
+    docfreq = (dtm > 0).T.dot(weights)
+    keep = (docfreq >= min_docfreq) & (docfreq <= max_docfreq_ratio * weights.sum())
+    if max_vocab and keep.sum() > max_vocab:
+        kept = np.flatnonzero(keep)
+        keep[kept[np.argsort(-docfreq[kept], kind="stable")[max_vocab:]]] = False
+    dtm = dtm[:, np.flatnonzero(keep)]
+    non_empty = np.flatnonzero(dtm.getnnz(axis=1))
+    return dtm[non_empty], vocab[keep], non_empty
+
+
+def weighted_dtm(dtm, weights):
+    # every row counted once per duplicate response
+    if (weights == 1).all():
+        return dtm
+    return dtm.multiply(weights[:, np.newaxis]).tocsr()
+
+
+def warm_start_lda(previous_model, previous_vocab, dtm, vocab, n_jobs=-1, passes=WARM_START_PASSES):
+    # continue an earlier fit (same k) on a vocabulary that only lost words; None if that is not the case
+    position = {term: i for i, term in enumerate(previous_vocab)}
+    columns = [position.get(term) for term in vocab]
+    if any(c is None for c in columns):
+        return None
+    model = copy.deepcopy(previous_model)
+    model.n_jobs = n_jobs
+    model.components_ = previous_model.components_[:, columns]
+    model.exp_dirichlet_component_ = np.exp(psi(model.components_) -
+                                            psi(model.components_.sum(axis=1))[:, np.newaxis])
+    model.n_features_in_ = len(vocab)
+    model.total_samples = dtm.shape[0]
+    for _ in range(passes):
+        model.partial_fit(dtm)
+    return model, model.transform(dtm)
+
+
+def fit_lda(dtm, number_of_topics, seed=20, n_jobs=-1, learning_method="online"):
+    model = LatentDirichletAllocation(
+        n_components=number_of_topics, learning_method=learning_method,
+        random_state=seed, n_jobs=n_jobs
+    )
+    doc_topic = model.fit_transform(dtm)
+    return model, doc_topic
+
+
+def fit_seed_models(dtm, number_of_topics, seeds, selection="perplexity", n_jobs=-1, holdout=0.1, fit_dtm=None):
+    # python side of fit_seed_models in "TM Common.R" (variational bayes only):
+    # one fit per seed, the best by held-out perplexity (winner refit on all
+    # documents) or mean umass coherence, plus the stability of its topics.
+    # fit_dtm: the (weighted) matrix to fit on, dtm the single documents
+    fit_dtm = dtm if fit_dtm is None else fit_dtm
+    rows = np.arange(dtm.shape[0])
+    heldout = np.array([], dtype=int)
+    if selection == "perplexity":
+        heldout = np.random.default_rng(1).choice(rows, max(1, round(holdout * len(rows))), replace=False)
+        rows = np.setdiff1d(rows, heldout)
+    # the seeds run side by side, one core each
+    fits = Parallel(n_jobs=min(len(seeds), n_jobs) if n_jobs > 0 else n_jobs)(
+        delayed(fit_lda)(fit_dtm[rows], number_of_topics, seed=seed, n_jobs=1) for seed in seeds)
+    models = [model for model, _ in fits]
+
+    if selection == "perplexity":
+        scores = [model.perplexity(dtm[heldout]) for model in models]
+        best = int(np.argmin(scores))
+    else:
+        scores = [topic_coherence(model, dtm).mean() for model in models]
+        best = int(np.argmax(scores))
+    runs = pd.DataFrame({"seed": list(seeds), "method": "VEM", "score": scores, "selection": selection})
+    runs["selected"] = np.arange(len(runs)) == best
+
+    if len(heldout):
+        model, doc_topic = fit_lda(fit_dtm, number_of_topics, seed=seeds[best], n_jobs=n_jobs)
+    else:
+        model, doc_topic = models[best], models[best].transform(fit_dtm)
+    return model, doc_topic, runs, topic_stability(models, best)
+
+
+def topic_coherence(model, dtm, n=10):
+    # umass coherence per topic over its top n terms (higher is better)
+    binary = (dtm > 0).astype(np.float64).tocsc()
+    scores = []
+    for weights in model.components_:
+        top = np.argsort(weights)[::-1][:n]
+        co = (binary[:, top].T @ binary[:, top]).toarray()
+        scores.append(sum(np.log((co[i, j] + 1) / co[j, j]) for i in range(1, len(top)) for j in range(i)))
+    return np.array(scores)
+
+
+def topic_stability(models, best, n=10):
+    # per topic of the best model: mean best jaccard overlap of its top n terms with the other models' topics
+    tops = [[set(np.argsort(weights)[::-1][:n]) for weights in model.components_] for model in models]
+    others = [topics for i, topics in enumerate(tops) if i != best]
+    stability = [np.mean([max(len(terms & other) / len(terms | other) for other in topics) for topics in others])
+                 if others else np.nan for terms in tops[best]]
+    return pd.DataFrame({"topic": np.arange(1, len(stability) + 1), "stability": stability})
+
+
+def top_terms_frame(model, vocab, n=TOP_TERMS_PER_TOPIC):
+    # beta = per-topic word distribution, top n words per topic
+    beta = model.components_ / model.components_.sum(axis=1, keepdims=True)
+    rows = []
+    for topic_idx, weights in enumerate(beta):
+        top = np.argsort(weights)[::-1][:n]
+        rows.extend((topic_idx + 1, vocab[i], float(weights[i])) for i in top)
+    return pd.DataFrame(rows, columns=["topic", "term", "beta"])
+
+
+def gamma_frame(doc_topic, document_ids):
+    # long document/topic/gamma table
+    k = doc_topic.shape[1]
+    doc_topic = doc_topic / doc_topic.sum(axis=1, keepdims=True)
+    return pd.DataFrame({
+        "document": np.repeat(document_ids, k),
+        "topic": np.tile(np.arange(1, k + 1), len(document_ids)),
+        "gamma": doc_topic.ravel(),
+    })
+
+
+def document_topic_table(data_selection, column_name, gamma, top_terms, sentiment=None):
+    # same layout as generate_document_topic_probabilities: text, length, one column per topic.
+    # duplicate responses get the row of their document.
+    # sentiment: scores per row_id (tm_sentiment.score_column), added after the length
+    wide = gamma.pivot(index="document", columns="topic", values="gamma")
+    rows = data_selection[data_selection["doc_id"].isin(wide.index)]
+    table = rows[[column_name, "resp_len"]].reset_index(drop=True)
+    if sentiment is not None:
+        scores = sentiment.set_index("row_id").reindex(rows["row_id"])
+        for name in scores.columns:
+            table[name] = scores[name].to_numpy()
+    wide = wide.loc[rows["doc_id"]]
+    for topic in wide.columns:
+        words = top_terms.loc[top_terms["topic"] == topic, "term"].tolist()
+        table[", ".join(words)] = wide[topic].to_numpy()
+    return table
+
+
+def document_topic_matrix(gamma, data_selection, column_name):
+    # same as document_topic_matrix in "TM Common.R": one row per document with id, text,
+    # number of responses with that text, dominant topic and its probability, topic_<n> columns
+    wide = gamma.pivot(index="document", columns="topic", values="gamma")
+    probabilities = wide.to_numpy()
+    dominant = probabilities.argmax(axis=1)
+    documents = data_selection.set_index("id")
+    columns = {
+        "document": wide.index.to_numpy(),
+        "text": documents[column_name].reindex(wide.index).to_numpy(),
+        "copies": data_selection["doc_id"].value_counts().reindex(wide.index).to_numpy(),
+        "dominant_topic": wide.columns.to_numpy()[dominant].astype(np.int32),
+        "dominant_gamma": probabilities[np.arange(len(wide)), dominant],
+    }
+    for position, topic in enumerate(wide.columns):
+        columns[f"topic_{int(topic)}"] = probabilities[:, position]
+    return pd.DataFrame(columns)
+
+
+def run_analysis(df, column_name, number_of_topics, filter_words=(), job=None, on_stage=None, n_jobs=-1,
+                 corpus=None, previous=None, language="nl", dedup=True, pruning=None, seeds=(20,),
+                 selection="perplexity"):
+    # full pipeline; returns dict with the corpus, dtm, model, top terms, gamma, export table and
+    # documents table (document_topic_matrix).
+    # corpus: prepare_corpus result of an earlier run on the same column (df is not needed then),
+    # previous: earlier run_analysis result on that corpus to warm-start from,
+    # language: stopwords of the responses, dedup: fold duplicate responses into weighted documents (prepare_corpus),
+    # pruning: prune_vocabulary limits (min_docfreq, max_docfreq_ratio, max_vocab),
+    # seeds/selection: more than one seed fits them all and keeps the best (fit_seed_models).
+    # on_stage(stage, docs=..., vocab=...) is called after every stage
+    job = job or EngineJob()
+    on_stage = on_stage or (lambda stage, **counts: None)
+
+    if corpus is None:
+        corpus = prepare_corpus(df, column_name, language=language, dedup=dedup)
+    data_selection = corpus["data_selection"]
+    on_stage("Data read and preprocessed", docs=len(data_selection))
+    job.check()
+
+    dtm, vocab, document_ids, weights = filter_corpus(corpus, filter_words)
+    vocab_before = len(vocab)
+    dtm, vocab, rows = prune_vocabulary(dtm, vocab, weights, **(pruning or {}))
+    document_ids, weights = document_ids[rows], weights[rows]
+    on_stage("Vocabulary pruned", docs=dtm.shape[0], vocab=dtm.shape[1])
+    on_stage("Text preprocessed and document-term matrix created", docs=dtm.shape[0], vocab=dtm.shape[1])
+    job.check()
+
+    # fit on the weighted matrix, gamma of the single documents
+    fit_dtm = weighted_dtm(dtm, weights)
+    fitted = None
+    seed_runs = stability = None
+    if len(seeds) > 1:
+        model, doc_topic, seed_runs, stability = fit_seed_models(dtm, number_of_topics, list(seeds), selection,
+                                                                 n_jobs=n_jobs, fit_dtm=fit_dtm)
+        on_stage("Seed models fitted", docs=dtm.shape[0], vocab=dtm.shape[1])
+    else:
+        if previous is not None and previous["model"].n_components == number_of_topics:
+            fitted = warm_start_lda(previous["model"], previous["vocab"], fit_dtm, vocab, n_jobs=n_jobs)
+        model, doc_topic = fitted or fit_lda(fit_dtm, number_of_topics, seed=seeds[0], n_jobs=n_jobs)
+    if fit_dtm is not dtm:
+        doc_topic = model.transform(dtm)
+    on_stage("Topic model fitted", docs=dtm.shape[0], vocab=dtm.shape[1])
+    job.check()
+
+    top_terms = top_terms_frame(model, vocab)
+    on_stage("Top terms extracted")
+
+    gamma = gamma_frame(doc_topic, document_ids)
+    table = document_topic_table(data_selection, column_name, gamma, top_terms)
+    documents = document_topic_matrix(gamma, data_selection, column_name)
+    on_stage("Document-topic probabilities generated and merged with data")
+
+    return {"corpus": corpus, "dtm": dtm, "vocab": vocab, "vocab_before": vocab_before, "model": model, "top_terms": top_terms,
+            "gamma": gamma, "table": table, "documents": documents, "data_selection": data_selection,
+            "warm_started": fitted is not None,
+            "seed_runs": seed_runs, "stability": stability}
+
+
+def run_job(job, func):
+    # func(job) wrapped into an EngineResult, for use on a background thread
+    try:
+        return EngineResult(0, func(job))
+    except EngineCancelled:
+        return EngineResult(-1, cancelled=True)
+    except Exception:
+        return EngineResult(1, stderr=traceback.format_exc())
@@ -0,0 +1,98 @@
+# ---------------------------------------
+# export writers
+# ---------------------------------------
+# python side of write_exports in "TM Common.R": the document-topic table in
+# every chosen format (xlsx, csv, parquet) and optionally the long
+# response/topic/gamma table next to it as <name>_gamma_long.<format>.
+# xlsx goes through xlsxwriter in constant-memory mode (rows are flushed to
+# disk as they are written) when it is installed, openpyxl otherwise. that
+# mode only keeps rows written in order, so the rows are written here one
+# after the other instead of through DataFrame.to_excel (which goes column
+# by column and would lose every flushed row).
+
+import os
+
+
+EXPORT_FORMATS = ("xlsx", "csv", "parquet")
+XLSX_MAX_ROWS = 1048576  # rows per worksheet, header included
+XLSX_CHUNK_ROWS = 10000  # rows converted to python values at a time
+
+
+def long_gamma_table(gamma, data_selection):
+    # one row per response (duplicates included): response id, topic, gamma
+    import pandas as pd
+
+    responses = data_selection[["id", "doc_id"]]
+    long = responses.merge(gamma, left_on="doc_id", right_on="document")
+    return pd.DataFrame({"response": long["id"].to_numpy(), "topic": long["topic"].astype(int).to_numpy(),
+                         "gamma": long["gamma"].to_numpy()})
+
+
+def write_xlsx(table, path):
+    # sheet "Sheet1" with a bold header row, like DataFrame.to_excel; missing
+    # values are left empty and text is never read as a formula or url
+    import datetime
+
+    import pandas as pd
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "nan_inf_to_errors": True})
+    try:
+        worksheet = workbook.add_worksheet("Sheet1")
+        header = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+        for col, name in enumerate(table.columns):
+            worksheet.write_string(0, col, str(name), header)
+        for start in range(0, len(table), XLSX_CHUNK_ROWS):
+            chunk = table.iloc[start:start + XLSX_CHUNK_ROWS]
+            columns = [chunk[name].astype(object).tolist() for name in chunk.columns]
+            for offset, values in enumerate(zip(*columns)):
+                row = start + offset + 1
+                for col, value in enumerate(values):
+                    if not isinstance(value, str) and pd.isna(value):
+                        continue
+                    if isinstance(value, bool):
+                        worksheet.write_boolean(row, col, value)
+                    elif isinstance(value, (int, float)):
+                        worksheet.write_number(row, col, value)
+                    elif isinstance(value, datetime.datetime):
+                        worksheet.write_datetime(row, col, value, date_format)
+                    else:
+                        worksheet.write_string(row, col, str(value))
+    finally:
+        workbook.close()
+
+
+def write_table(table, path, export_format):
+    if export_format == "xlsx":
+        try:
+            import xlsxwriter  # noqa: F401
+        except ImportError:
+            table.to_excel(path, index=False)
+        else:
+            write_xlsx(table, path)
+    elif export_format == "csv":
+        table.to_csv(path, index=False)
+    elif export_format == "parquet":
+        table.to_parquet(path, index=False)
+    else:
+        raise ValueError(f"unknown export format: {export_format}")
+
+
+def write_exports(table, output_file, formats=("xlsx",), long_gamma=None):
+    # output_file: the .xlsx path, the other formats only change the extension.
+    # returns the written paths
+    base = os.path.splitext(output_file)[0]
+    written = []
+    for export_format in formats:
+        path = f"{base}.{export_format}"
+        write_table(table, path, export_format)
+        written.append(path)
+        if long_gamma is None:
+            continue
+        if export_format == "xlsx" and len(long_gamma) >= XLSX_MAX_ROWS:
+            continue  # too large for a worksheet, csv/parquet only
+        path = f"{base}_gamma_long.{export_format}"
+        write_table(long_gamma, path, export_format)
+        written.append(path)
+    return written
@@ -0,0 +1,115 @@
+# ---------------------------------------
+# run profiles
+# ---------------------------------------
+# every stage of a job reports a structured event: stage name, wall time,
+# peak memory, number of documents and vocabulary size. the r scripts write
+# them to stderr as "TM_EVENT {json}" (report_stage in "TM Common.R"),
+# python stages use a StageRecorder. the events of one job are saved as a
+# json log in .tm_cache/profiles and shown in the app's "Run Profile" window.
+#
+# peak memory: r events report the peak of the r heap since the previous
+# stage, python events the peak resident memory of the app process so far.
+
+import datetime
+import json
+import os
+import sys
+import time
+import uuid
+
+
+EVENT_PREFIX = "TM_EVENT "
+
+
+def parse_event(line):
+    # event dict of a "TM_EVENT {...}" line, None for any other line
+    line = line.strip()
+    if not line.startswith(EVENT_PREFIX):
+        return None
+    try:
+        event = json.loads(line[len(EVENT_PREFIX):])
+    except ValueError:
+        return None
+    event.setdefault("source", "r")
+    return event
+
+
+def _windows_peak_memory():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                             ctypes.byref(counters), counters.cb)
+    return counters.PeakWorkingSetSize
+
+
+def peak_memory_mb():
+    # peak resident memory of this process, None if the platform does not tell
+    try:
+        if os.name == "nt":
+            return _windows_peak_memory() / (1024 * 1024)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macos, kilobytes elsewhere
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except Exception:
+        return None
+
+
+class StageRecorder:
+    # python counterpart of report_stage: time since the previous stage
+    # (started: perf_counter value the first stage is timed from, default now)
+    def __init__(self, source="python", started=None):
+        self.source = source
+        self.started = time.perf_counter() if started is None else started
+
+    def stage(self, stage, docs=None, vocab=None):
+        now = time.perf_counter()
+        peak = peak_memory_mb()
+        event = {"stage": stage, "seconds": round(now - self.started, 3),
+                 "peak_mb": round(peak, 1) if peak is not None else None, "source": self.source}
+        if docs is not None:
+            event["docs"] = int(docs)
+        if vocab is not None:
+            event["vocab"] = int(vocab)
+        self.started = now
+        return event
+
+
+def write_profile(directory, events, **info):
+    # json log of one job; file names sort by start time
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"{stamp}-{uuid.uuid4().hex[:6]}.json")
+    profile = dict(info, total_seconds=round(sum(e.get("seconds") or 0 for e in events), 3), events=events)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(profile, file, indent=2, default=str)
+    return path
+
+
+def prune_profiles(directory, keep):
+    # remove all but the newest `keep` logs
+    if not os.path.isdir(directory):
+        return
+    logs = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    for name in logs[:max(0, len(logs) - keep)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def format_event(event):
+    # one line per event for the console
+    counts = "".join(f"  {name}={event[name]}" for name in ("docs", "vocab") if event.get(name) is not None)
+    memory = f"{event['peak_mb']:8.1f} MB" if event.get("peak_mb") is not None else " " * 11
+    return f"{event.get('seconds', 0):8.1f} s {memory}  {event['stage']}{counts}"
@@ -0,0 +1,144 @@
+# ---------------------------------------
+# result bundles
+# ---------------------------------------
+# an analysis run writes its results to a run directory instead of printing
+# them to stdout: one uncompressed feather file per table (tuning metrics,
+# top terms, gamma, ...) and a manifest.json that is written last.
+# both engines write the same layout, the app only reads bundles.
+# DocumentTopics pages over the documents table (one row per document, one
+# column per topic) for the results browser: sorting and filtering only touch
+# the memory-mapped topic columns, a page takes its few rows from the file.
+
+import datetime
+import json
+import os
+import shutil
+import uuid
+
+
+MANIFEST_NAME = "manifest.json"
+
+
+def new_run_dir(parent):
+    # fresh directory for one run, names sort by creation time
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    run_dir = os.path.join(parent, f"{stamp}-{uuid.uuid4().hex[:6]}")
+    os.makedirs(run_dir)
+    return run_dir
+
+
+def prune_run_dirs(parent, keep):
+    # remove all but the newest `keep` run directories
+    if not os.path.isdir(parent):
+        return
+    runs = sorted(name for name in os.listdir(parent) if os.path.isdir(os.path.join(parent, name)))
+    for name in runs[:max(0, len(runs) - keep)]:
+        shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+def write_bundle(result_dir, tables, **info):
+    # python side of write_result_bundle in "TM Common.R"
+    import pyarrow.feather as feather
+
+    os.makedirs(result_dir, exist_ok=True)
+    files = {}
+    for name, table in tables.items():
+        if table is None:
+            continue
+        file_name = f"{name}.feather"
+        feather.write_feather(table.reset_index(drop=True), os.path.join(result_dir, file_name),
+                              compression="uncompressed")
+        files[name] = file_name
+    manifest = dict(info, format=1, files=files)
+    with open(os.path.join(result_dir, MANIFEST_NAME), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2, default=str)
+
+
+class ResultBundle:
+    # tables of a finished run, each read (memory-mapped) on first access
+    def __init__(self, result_dir):
+        self.result_dir = result_dir
+        manifest_path = os.path.join(result_dir, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"no results in {result_dir}")
+        with open(manifest_path, encoding="utf-8") as file:
+            self.manifest = json.load(file)
+        self.files = self.manifest.get("files") or {}
+        self._tables = {}
+
+    def has(self, name):
+        return name in self.files
+
+    def path(self, name):
+        return os.path.join(self.result_dir, self.files[name])
+
+    def table(self, name):
+        if name not in self._tables:
+            self._tables[name] = self.arrow_table(name).to_pandas()
+        return self._tables[name]
+
+    def arrow_table(self, name):
+        # the memory-mapped arrow table, columns are only read when they are used
+        import pyarrow.feather as feather
+        return feather.read_table(self.path(name), memory_map=True)
+
+    def get(self, name):
+        return self.table(name) if self.has(name) else None
+
+    def info(self, name, default=None):
+        return self.manifest.get(name, default)
+
+
+def is_bundle(result_dir):
+    return os.path.exists(os.path.join(result_dir, MANIFEST_NAME))
+
+
+class DocumentTopics:
+    # rows of a bundle's documents table in browse order: sort() and
+    # filter() only rebuild an array of row numbers, page() reads the rows
+    # of one page. columns: document, text, copies, dominant_topic,
+    # dominant_gamma, topic_1 .. topic_k
+    def __init__(self, bundle):
+        import numpy as np
+
+        self.table = bundle.arrow_table("documents")
+        self.topics = sorted((int(name[len("topic_"):]) for name in self.table.column_names
+                              if name.startswith("topic_")))
+        self.dominant = self.table.column("dominant_topic").to_numpy()
+        self.sort_topic = None  # None = order of the documents
+        self.descending = True
+        self.dominant_topic = None  # None = all documents
+        self.rows = np.arange(self.table.num_rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def total(self):
+        return self.table.num_rows
+
+    def column(self, topic):
+        # probabilities of one topic, zero-copy from the mapped file
+        return self.table.column(f"topic_{topic}").to_numpy()
+
+    def sort(self, topic, descending=True):
+        self.sort_topic, self.descending = topic, descending
+        self.update()
+
+    def filter(self, dominant_topic):
+        self.dominant_topic = dominant_topic
+        self.update()
+
+    def update(self):
+        import numpy as np
+
+        rows = (np.arange(self.table.num_rows) if self.dominant_topic is None
+                else np.flatnonzero(self.dominant == self.dominant_topic))
+        if self.sort_topic is not None:
+            values = self.column(self.sort_topic)[rows]
+            order = np.argsort(-values if self.descending else values, kind="stable")
+            rows = rows[order]
+        self.rows = rows
+
+    def page(self, start, size):
+        # dicts of the rows start .. start + size in browse order
+        return self.table.take(self.rows[start:start + size]).to_pylist()
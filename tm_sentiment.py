@@ -0,0 +1,165 @@
+# ---------------------------------------
+# lexicon sentiment
+# ---------------------------------------
+# every response gets a score from -1 (negative) to 1 (positive): the lexicon
+# weights of its words (lexicons/sentiment_<language>.tsv) are summed, a word
+# right after a negation ("niet", "geen", "not") counts reversed and halved,
+# a word after an intensifier ("heel", "erg", "very") 1.5 times, and the sum
+# is squashed with s / sqrt(s^2 + 15) (as in vader).
+# a column is scored with numpy operations on word codes (tm_data.tokenize_responses):
+# the codes of the TokenIndex the word cloud already built when there is one,
+# otherwise the responses are tokenized in batches. scores are cached per
+# response text hash, one feather file per language and lexicon shared by
+# all workbooks, so a column is only scored once.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from tm_cache import file_sha256, make_key, replaced_atomically
+from tm_data import tokenize_responses
+
+
+LEXICON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicons")
+NEGATIONS = {
+    "nl": ("niet", "geen", "nooit", "niets", "niks", "nergens", "noch"),
+    # "t" is what is left of "n't" ("don't" -> "don", "t")
+    "en": ("not", "no", "never", "nothing", "nobody", "nowhere", "neither", "nor", "without", "t"),
+}
+INTENSIFIERS = {
+    "nl": ("heel", "erg", "zeer", "echt", "enorm", "ontzettend", "bijzonder", "extreem", "zo", "te"),
+    "en": ("very", "really", "extremely", "so", "too", "incredibly", "absolutely", "highly", "quite"),
+}
+NEGATION_FACTOR = -0.5
+INTENSIFIER_FACTOR = 1.5
+SQUASH_ALPHA = 15
+SCORE_COLUMNS = ("sentiment", "sentiment_label")
+
+
+class Lexicon:
+    # word weights, negations and intensifiers of one language
+    def __init__(self, language):
+        path = os.path.join(LEXICON_DIR, f"sentiment_{language}.tsv")
+        if language not in NEGATIONS or not os.path.exists(path):
+            raise ValueError(f"no sentiment lexicon for language '{language}' (available: {', '.join(NEGATIONS)})")
+        self.language = language
+        self.weights = {}
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip() and not line.startswith("#"):
+                    word, weight = line.rstrip("\n").split("\t")
+                    self.weights[word] = float(weight)
+        self.negations = frozenset(NEGATIONS[language])
+        self.intensifiers = frozenset(INTENSIFIERS[language])
+        # changes with the lexicon file or the scoring rules, part of the cache file name
+        self.version = make_key(file_sha256(path), sorted(self.negations), sorted(self.intensifiers),
+                                NEGATION_FACTOR, INTENSIFIER_FACTOR, SQUASH_ALPHA)[:16]
+
+    def arrays(self, vocab):
+        # weight, negation and intensifier flag of every word code
+        weights = np.array([self.weights.get(w, 0.0) for w in vocab])
+        negations = np.array([w in self.negations for w in vocab])
+        intensifiers = np.array([w in self.intensifiers for w in vocab])
+        return weights, negations, intensifiers
+
+
+def score_codes(codes, vocab, lexicon):
+    # score per response of tokenize_responses output (code 0 ends a response)
+    weights, negations, intensifiers = lexicon.arrays(vocab)
+    values = weights[codes]
+    # the separator is neither a negation nor an intensifier, so nothing crosses responses
+    previous = np.concatenate(([0], codes[:-1])) if len(codes) else codes
+    values = np.where(negations[previous], values * NEGATION_FACTOR, values)
+    values = np.where(intensifiers[previous], values * INTENSIFIER_FACTOR, values)
+    ends = codes == 0
+    response = np.cumsum(ends) - ends
+    totals = np.bincount(response, weights=values, minlength=int(ends.sum()))
+    return totals / np.sqrt(totals ** 2 + SQUASH_ALPHA)
+
+
+def score_texts(texts, lexicon, batch_size=50000):
+    # scores of a list of responses, tokenized batch by batch
+    scores = [score_codes(*tokenize_responses(texts[start:start + batch_size]), lexicon)
+              for start in range(0, len(texts), batch_size)]
+    return np.concatenate(scores) if scores else np.array([])
+
+
+def text_hashes(texts):
+    # 64-bit hash per response text, the key of the score cache
+    return pd.util.hash_pandas_object(pd.Series(texts, dtype=object), index=False).to_numpy()
+
+
+def labels(scores, neutral_band=0.05):
+    return np.where(scores > neutral_band, "positive", np.where(scores < -neutral_band, "negative", "neutral"))
+
+
+class ScoreCache:
+    # text hash -> score, one feather file per language and lexicon version;
+    # only the newest max_entries scores are kept
+    def __init__(self, directory, lexicon, max_entries=2000000):
+        self.path = os.path.join(directory, f"sentiment_{lexicon.language}_{lexicon.version}.feather")
+        self.max_entries = max_entries
+        self.scores = pd.Series(dtype=np.float64, index=pd.Index([], dtype=np.uint64))
+        if os.path.exists(self.path):
+            try:
+                frame = pd.read_feather(self.path)
+                self.scores = pd.Series(frame["score"].to_numpy(), index=pd.Index(frame["hash"].to_numpy()))
+            except (OSError, ValueError, KeyError):
+                pass  # unreadable cache, rebuilt on save
+
+    def lookup(self, hashes):
+        # cached scores, nan where a text has not been scored yet
+        return self.scores.reindex(hashes).to_numpy(dtype=np.float64, copy=True)
+
+    def add(self, hashes, scores):
+        added = pd.Series(scores, index=pd.Index(hashes))
+        combined = pd.concat([self.scores, added])
+        self.scores = combined[~combined.index.duplicated(keep="last")].iloc[-self.max_entries:]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with replaced_atomically(self.path) as tmp_path:
+            pd.DataFrame({"hash": self.scores.index.to_numpy(), "score": self.scores.to_numpy()}).to_feather(tmp_path)
+
+
+def score_column(series, language, cache_dir, index=None, batch_size=50000, neutral_band=0.05, on_stage=None):
+    # sentiment of every response of a column: row_id (1-based row of the column,
+    # like the feather input of the r scripts), sentiment and sentiment_label.
+    # index: TokenIndex of the same column (built from series.dropna()), reused when given
+    on_stage = on_stage or (lambda stage, **counts: None)
+    lexicon = Lexicon(language)
+    present = series.notna().to_numpy()
+    texts = series[present].astype(str).tolist()
+    hashes = text_hashes(texts)
+    cache = ScoreCache(os.path.expanduser(cache_dir), lexicon)
+    scores = cache.lookup(hashes)
+    missing = np.isnan(scores)
+    on_stage("Cached scores read", docs=len(texts))
+
+    if missing.any():
+        if index is not None and index.document_count == len(texts):
+            scores[missing] = score_codes(index.codes, index.vocab, lexicon)[missing]
+        else:
+            # every distinct text once
+            _, first, inverse = np.unique(hashes[missing], return_index=True, return_inverse=True)
+            positions = np.flatnonzero(missing)[first]
+            scores[missing] = score_texts([texts[i] for i in positions], lexicon, batch_size)[inverse]
+        cache.add(hashes[missing], scores[missing])
+        cache.save()
+    on_stage("Responses scored", docs=int(missing.sum()))
+
+    return pd.DataFrame({"row_id": np.flatnonzero(present) + 1, "sentiment": scores,
+                         "sentiment_label": labels(scores, neutral_band)})
+
+
+def sentiment_report(scores, column_name):
+    # text summary of a scored column
+    counts = scores["sentiment_label"].value_counts()
+    total = max(len(scores), 1)
+    lines = [f"Sentiment of '{column_name}': {len(scores):,} responses, mean score {scores['sentiment'].mean():.2f}"]
+    for label in ("positive", "neutral", "negative"):
+        lines.append(f"  {label:<9} {counts.get(label, 0):>8,}  ({counts.get(label, 0) / total:.0%})")
+    lines.append("")
+    lines.append("The sentiment and sentiment_label columns are added to the exported document-topic table.")
+    return "\n".join(lines)
@@ -0,0 +1,607 @@
+# ---------------------------------------
+# shared analysis service
+# ---------------------------------------
+# one process on a shared analysis server runs the analysis, export and word
+# cloud jobs of every analyst, instead of a tk instance with its own r
+# workers per person:
+#
+#   python tm_service.py --port 8765 --workers 2
+#
+# the app sends its jobs here when "service_url" is set in its config
+# (e.g. "http://127.0.0.1:8765"). json over http:
+#   POST /jobs        {"kind": "analysis" | "export" | "wordcloud", "file": <workbook>,
+#                      "sheet", "column", "topics", "filter_words": [...], "engine", ...}
+#                     -> 202 {"id", "status", ...}, 503 when the queue is full
+#   GET  /jobs/<id>   -> status ("queued", "running", "done", "failed"), stage events, result
+#   GET  /status      -> queued and running jobs, workers, cached results
+# a job id is the hash of everything its result depends on (workbook content,
+# sheet, column, topics, filter words, engine, options, pipeline settings and
+# code), so identical requests share one job while it is queued or running
+# and are answered from the result cache once it is done. the pipeline
+# settings (language, pruning, seeds, tagger, ...) are the service's own
+# copy of PIPELINE_CONFIG (tm_config.py), see config below. results are files on this machine (run bundle, export files,
+# word cloud png) that the clients read directly. models, columns and tokens
+# go to the .tm_cache next to the workbook, shared with the app and tm_batch.py.
+
+import argparse
+import datetime
+import http.server
+import json
+import os
+import queue
+import re
+import shutil
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+
+from tm_cache import ArtifactCache, file_sha256, make_key, replaced_atomically
+from tm_config import PIPELINE_CONFIG, column_key, dataset_key, model_key, pipeline_args, pruning_options, seeds
+from tm_data import FrameCache, TokenIndex, Workbook
+from tm_profile import StageRecorder, parse_event
+
+
+# ---------------------------------------
+# config section
+# ---------------------------------------
+config = {
+    # pipeline settings and cache layout, the same as the app's unless changed here
+    **PIPELINE_CONFIG,
+    "tagger_workers": 1,  # per job, the workers already run jobs side by side
+    "host": "127.0.0.1",
+    "port": 8765,
+    # jobs running side by side (one r worker each) and jobs waiting for them
+    "workers": 2,
+    "queue_size": 20,
+    # finished jobs kept by input key; their files live in service_cache_dir/artifacts
+    "service_cache_dir": "~/.tm_cache/service",
+    "result_cache_entries": 200,
+    "finished_jobs_kept": 200,  # status of finished/failed jobs kept in memory for polling clients
+    "token_indexes_kept": 8,  # columns whose word counts stay in memory for word clouds
+    "python_engine_default_topics": 5,
+    "wordcloud_width": 800,
+    "wordcloud_height": 400,
+    "wordcloud_max_words": 200,
+    "data_cache_mb": 512,
+    "analysis_script": "TM Single file Viz.R",
+    "export_script": "TM Single file Export.R",
+}
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+JOB_KINDS = ("analysis", "export", "wordcloud")
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{64}")  # make_key output, the only ids that reach the cache
+EXPORT_FORMATS = ("xlsx", "csv", "parquet")
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+class ServiceError(Exception):
+    pass
+
+
+def write_atomic(path, write, encoding="utf-8"):
+    # write(file) into a temp file of its own and move it in place (replaced_atomically)
+    with replaced_atomically(path) as tmp_path:
+        with open(tmp_path, "w", encoding=encoding) as file:
+            write(file)
+
+
+def code_version(kind, engine):
+    # hash of the code that produces a result, so changed scripts are not answered from the cache
+    if kind == "wordcloud":
+        names = ["tm_data.py", "tm_charts.py"]
+    elif engine == "Python":
+        names = ["tm_engine.py", "tm_export.py", "tm_results.py"]
+    else:
+        names = [config["analysis_script"] if kind == "analysis" else config["export_script"], "TM Common.R"]
+    return [file_sha256(os.path.join(SCRIPT_DIR, name)) for name in names
+            if os.path.exists(os.path.join(SCRIPT_DIR, name))]
+
+
+def normalize_request(payload):
+    # validated job request with defaults; ValueError for a request that cannot run
+    kind = payload.get("kind")
+    if kind not in JOB_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(JOB_KINDS)}")
+    path = payload.get("file")
+    if not path or not os.path.isfile(path):
+        raise ValueError(f"workbook not found on the service machine: {path}")
+    if not payload.get("column"):
+        raise ValueError("column is required")
+    request = {
+        "kind": kind,
+        "file": os.path.abspath(path),
+        "sheet": payload.get("sheet") or "",
+        "column": str(payload["column"]),
+        "filter_words": sorted({str(w).strip().lower() for w in payload.get("filter_words", []) if str(w).strip()}),
+    }
+    if kind == "wordcloud":
+        for name in ("width", "height", "max_words"):
+            request[name] = int(payload.get(name) or config[f"wordcloud_{name}"])
+        return request
+    request["engine"] = payload.get("engine") or "R"
+    if request["engine"] not in ("R", "Python"):
+        raise ValueError("engine must be R or Python")
+    request["topics"] = int(payload.get("topics") or 0)
+    if kind == "export":
+        request["formats"] = [f for f in EXPORT_FORMATS if f in payload.get("formats", ["xlsx"])] or ["xlsx"]
+        request["long_gamma"] = bool(payload.get("long_gamma"))
+        sentiment_file = payload.get("sentiment_file")
+        if sentiment_file and not os.path.isfile(sentiment_file):
+            raise ValueError(f"sentiment file not found on the service machine: {sentiment_file}")
+        request["sentiment_file"] = os.path.abspath(sentiment_file) if sentiment_file else None
+    return request
+
+
+def request_key(request):
+    # identical inputs, settings and code give the same key
+    inputs = {name: value for name, value in request.items() if name not in ("file", "sentiment_file")}
+    settings = [config[name] for name in ("language", "dedup_responses", "fit_methods", "fit_selection",
+                                          "tuning_sweep", "tagger", "tagger_command")]
+    return make_key(inputs, file_sha256(request["file"]),
+                    file_sha256(request["sentiment_file"]) if request.get("sentiment_file") else None,
+                    pruning_options(config), seeds(config), settings,
+                    code_version(request["kind"], request.get("engine")))
+
+
+class ServiceJob:
+    # one queued, running or finished job, shared by every client that submitted it
+    def __init__(self, key, request):
+        self.key = key
+        self.request = request
+        self.status = "queued"
+        self.events = []
+        self.result = None
+        self.error = None
+        self.submissions = 1
+        self.submitted = time.time()
+        self.seconds = None
+
+    def describe(self):
+        return {"id": self.key, "kind": self.request["kind"], "status": self.status, "events": self.events,
+                "result": self.result, "error": self.error, "submissions": self.submissions,
+                "seconds": self.seconds}
+
+
+class AnalysisService:
+    # bounded job queue, a fixed number of worker threads and the result cache
+    def __init__(self, cache_dir, workers, queue_size, rscript=None):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.results = ArtifactCache(os.path.join(self.cache_dir, "results"),
+                                     max_entries=config["result_cache_entries"], suffix=".json")
+        self.workers = max(1, int(workers))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.jobs = OrderedDict()  # key -> ServiceJob, oldest first
+        self.lock = threading.Lock()
+        self.rscript = rscript
+        self._r_pool = None
+        self._workbooks = {}
+        self._token_indexes = OrderedDict()
+        self.frame_cache = FrameCache(config["data_cache_mb"] * 1024 * 1024)
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, payload):
+        # job description for a request: the running or cached one when it is identical
+        request = normalize_request(payload)
+        key = request_key(request)
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is not None and job.status in ("queued", "running"):
+                job.submissions += 1
+                return job.describe()
+            cached = self.cached(key)
+            if cached is not None:
+                return cached
+            job = ServiceJob(key, request)
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                raise ServiceBusy(f"{self.queue.qsize()} jobs are waiting, try again later")
+            self.jobs[key] = job
+            self.jobs.move_to_end(key)
+        print(f"queued {request['kind']} {os.path.basename(request['file'])} / {request['column']} ({key[:8]})")
+        return job.describe()
+
+    def get(self, key):
+        # job description by id, None for an unknown (or malformed) id
+        if not JOB_ID_PATTERN.fullmatch(key):
+            return None
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is not None:
+                return job.describe()
+        return self.cached(key)
+
+    def status(self):
+        with self.lock:
+            running = [job.describe() for job in self.jobs.values() if job.status == "running"]
+        return {"workers": self.workers, "queued": self.queue.qsize(), "queue_size": self.queue.maxsize,
+                "running": running, "cached_results": len(self.results.entries())}
+
+    def cached(self, key):
+        # finished job from the result cache, None when missing or its files are gone
+        if not self.results.touch(key):
+            return None
+        try:
+            with open(self.results.path_for(key), encoding="utf-8") as file:
+                record = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isdir(self.artifact_dir(key)):
+            return None
+        record["status"] = "done"
+        record["cached"] = True
+        return record
+
+    def artifact_dir(self, key):
+        return os.path.join(self.cache_dir, "artifacts", key)
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            job.status = "running"
+            started = time.perf_counter()
+            out_dir = self.artifact_dir(job.key)
+            shutil.rmtree(out_dir, ignore_errors=True)
+            os.makedirs(out_dir)
+            try:
+                runner = {"analysis": self.run_analysis, "export": self.run_export,
+                          "wordcloud": self.run_wordcloud}[job.request["kind"]]
+                job.result = runner(job, out_dir)
+                job.seconds = round(time.perf_counter() - started, 3)
+                self.save_result(job)
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e) or type(e).__name__
+                job.seconds = round(time.perf_counter() - started, 3)
+                job.status = "failed"
+                shutil.rmtree(out_dir, ignore_errors=True)
+            print(f"{job.status} {job.request['kind']} {job.key[:8]} in {job.seconds:.1f} s"
+                  + (f": {job.error}" if job.error else ""))
+            self._forget_finished()
+            self.queue.task_done()
+
+    def save_result(self, job):
+        record = dict(job.describe(), finished=datetime.datetime.now().isoformat(timespec="seconds"))
+        write_atomic(self.results.path_for(job.key), lambda file: json.dump(record, file, indent=2, default=str))
+        for path in self.results.evict():
+            shutil.rmtree(self.artifact_dir(os.path.basename(path)[:-len(self.results.suffix)]), ignore_errors=True)
+
+    def _forget_finished(self):
+        # finished jobs are answered from the result cache, failed ones are kept for a while
+        with self.lock:
+            finished = [key for key, job in self.jobs.items() if job.status in ("done", "failed")]
+            for key in finished[:max(0, len(finished) - config["finished_jobs_kept"])]:
+                del self.jobs[key]
+
+    # ---- pipeline ----
+
+    def r_pool(self):
+        # one r worker per service worker thread, started on first use
+        with self.lock:
+            if self._r_pool is None:
+                from tm_worker import RWorkerPool, find_rscript
+                self._r_pool = RWorkerPool(self.rscript or find_rscript(), size=self.workers)
+            return self._r_pool
+
+    def workbook(self, path):
+        with self.lock:
+            stat = os.stat(path)
+            key = (path, stat.st_size, stat.st_mtime_ns)
+            if key not in self._workbooks:
+                self._workbooks[key] = Workbook(path, self.frame_cache)
+            return self._workbooks[key]
+
+    def token_index(self, request):
+        # word counts of a column, kept for the next word cloud with other filter words
+        key = (file_sha256(request["file"]), request["sheet"], request["column"])
+        with self.lock:
+            if key in self._token_indexes:
+                self._token_indexes.move_to_end(key)
+                return self._token_indexes[key]
+        texts = self.workbook(request["file"]).column(request["sheet"], request["column"]).dropna().astype(str).tolist()
+        index = TokenIndex(texts)
+        with self.lock:
+            self._token_indexes[key] = index
+            while len(self._token_indexes) > config["token_indexes_kept"]:
+                self._token_indexes.popitem(last=False)
+        return index
+
+    def run_wordcloud(self, job, out_dir):
+        from tm_charts import wordcloud_image
+
+        request = job.request
+        recorder = StageRecorder()
+        index = self.token_index(request)
+        job.events.append(recorder.stage("Token index built", docs=index.document_count, vocab=len(index.counts)))
+        image = wordcloud_image(index, frozenset(request["filter_words"]), request["width"], request["height"],
+                                request["max_words"])
+        path = os.path.join(out_dir, "wordcloud.png")
+        image.save(path)
+        job.events.append(recorder.stage("Word cloud rendered"))
+        return {"image": path}
+
+    def run_analysis(self, job, out_dir):
+        if job.request["engine"] == "Python":
+            return self.run_python(job, out_dir)
+        from tm_results import is_bundle
+
+        result = self.run_r(job, os.path.join(SCRIPT_DIR, config["analysis_script"]),
+                            [f"--result_dir={out_dir}", f"--tuning={config['tuning_sweep']}"])
+        if result.returncode != 0 or not is_bundle(out_dir):
+            message = result.stdout.strip() or result.stderr.strip()
+            raise RuntimeError(message.splitlines()[-1] if message else f"R exit code {result.returncode}")
+        return {"result_dir": out_dir}
+
+    def run_export(self, job, out_dir):
+        request = job.request
+        output_file = os.path.join(out_dir, f"Tamam_output_tm_analysis_{request['column']}.xlsx")
+        if request["engine"] == "Python":
+            return self.run_python(job, out_dir, output_file)
+        extra = [f"--output_file={output_file}", f"--export_formats={','.join(request['formats'])}",
+                 f"--long_gamma={str(request['long_gamma']).lower()}"]
+        if request["sentiment_file"]:
+            extra.append(f"--sentiment_file={request['sentiment_file']}")
+        result = self.run_r(job, os.path.join(SCRIPT_DIR, config["export_script"]), extra)
+        # the export script catches its own errors and prints them to stdout
+        if result.returncode != 0 or not any(e["stage"] == "Export written" for e in job.events):
+            message = result.stdout.strip() or result.stderr.strip()
+            raise RuntimeError(message.splitlines()[-1] if message else f"R exit code {result.returncode}")
+        return {"files": sorted(os.path.join(out_dir, name) for name in os.listdir(out_dir))}
+
+    def run_r(self, job, script, extra_args):
+        # analysis or export script in an r worker, with the caches the app uses next to the workbook
+        request = job.request
+        cache_dir = os.path.join(os.path.dirname(request["file"]), config["cache_dir_name"])
+        workbook_hash = file_sha256(request["file"])
+        filter_file = self.filter_words_file(request["filter_words"])
+
+        column_cache = ArtifactCache(os.path.join(cache_dir, "columns"), max_entries=config["column_cache_entries"],
+                                     suffix=".feather")
+        column = column_key(workbook_hash, request["sheet"], request["column"])
+        if not column_cache.touch(column):
+            self.workbook(request["file"]).write_column(request["sheet"], request["column"],
+                                                        column_cache.path_for(column))
+            column_cache.evict()
+        model_cache = ArtifactCache(os.path.join(cache_dir, "models"), max_entries=config["model_cache_entries"])
+        model = model_key(workbook_hash, request["sheet"], request["column"], request["topics"], filter_file, config)
+        model_cache.touch(model)
+        token_cache = ArtifactCache(os.path.join(cache_dir, "tokens"), max_entries=config["token_cache_entries"])
+        tokens = dataset_key(workbook_hash, request["sheet"], request["column"], config)
+        token_cache.touch(tokens)
+        tuning_cache = ArtifactCache(os.path.join(cache_dir, "tuning"), max_entries=config["tuning_cache_entries"])
+
+        script_args = [
+            os.path.dirname(request["file"]), os.path.basename(request["file"]), request["sheet"],
+            request["column"], str(request["topics"]), filter_file,
+            f"--artifact_file={model_cache.path_for(model)}",
+            *pipeline_args(config),
+            "--cores=1",  # the workers already run jobs side by side
+            f"--language_cache_dir={os.path.join(cache_dir, 'languages')}",
+            f"--tuning_cache_dir={tuning_cache.directory}",
+            f"--input_file={column_cache.path_for(column)}",
+            f"--token_file={token_cache.path_for(tokens)}",
+            *extra_args,
+        ]
+
+        def on_stderr(line):
+            event = parse_event(line)
+            if event is not None:
+                job.events.append(event)
+
+        result = self.r_pool().run(script, script_args, on_stderr=on_stderr)
+        for cache in (model_cache, token_cache, tuning_cache):
+            cache.evict()
+        return result
+
+    def filter_words_file(self, filter_words):
+        # the r scripts read filter words from a file, one per content
+        directory = os.path.join(self.cache_dir, "filters")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, make_key(filter_words) + ".txt")
+        if not os.path.exists(path):
+            # in the locale encoding, like the filter files the app writes for the r scripts
+            write_atomic(path, lambda file: file.write("\n".join(filter_words)), encoding=None)
+        return path
+
+    def run_python(self, job, out_dir, output_file=None):
+        # python engine (tm_engine.py): a result bundle, or the export files with output_file
+        import tm_engine
+        from tm_export import long_gamma_table, write_exports
+        from tm_results import write_bundle
+
+        request = job.request
+        recorder = StageRecorder()
+
+        def on_stage(stage, **counts):
+            job.events.append(recorder.stage(stage, **counts))
+
+        topics = request["topics"] if request["topics"] >= 2 else config["python_engine_default_topics"]
+        df = self.workbook(request["file"]).column(request["sheet"], request["column"]).to_frame()
+        analysis = tm_engine.run_analysis(df, request["column"], topics, request["filter_words"],
+                                          on_stage=on_stage, n_jobs=max(1, (os.cpu_count() or 2) // self.workers),
+                                          language=config["language"], dedup=config["dedup_responses"],
+                                          pruning=pruning_options(config), seeds=seeds(config),
+                                          selection=config["fit_selection"])
+        if output_file is None:
+            write_bundle(out_dir, {"top_terms": analysis["top_terms"], "gamma": analysis["gamma"],
+                                   "documents": analysis["documents"],
+                                   "seed_runs": analysis["seed_runs"], "stability": analysis["stability"]},
+                         number_of_topics=topics, documents=analysis["dtm"].shape[0],
+                         terms=analysis["dtm"].shape[1], terms_before_pruning=analysis["vocab_before"])
+            return {"result_dir": out_dir}
+        table = analysis["table"]
+        if request["sentiment_file"]:
+            import pandas as pd
+            table = tm_engine.document_topic_table(analysis["data_selection"], request["column"], analysis["gamma"],
+                                                   analysis["top_terms"],
+                                                   sentiment=pd.read_feather(request["sentiment_file"]))
+        long_gamma = (long_gamma_table(analysis["gamma"], analysis["data_selection"])
+                      if request["long_gamma"] else None)
+        files = write_exports(table, output_file, request["formats"], long_gamma)
+        on_stage("Export written")
+        return {"files": files}
+
+
+class ServiceHandler(http.server.BaseHTTPRequestHandler):
+    # json api of an AnalysisService (self.server.service)
+    def send_json(self, status, body, headers=()):
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/status":
+            self.send_json(200, service.status())
+        elif self.path.startswith("/jobs/"):
+            job = service.get(self.path[len("/jobs/"):])
+            if job is None:
+                self.send_json(404, {"error": "unknown job"})
+            else:
+                self.send_json(200, job)
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            job = self.server.service.submit(payload)
+        except ServiceBusy as e:
+            self.send_json(503, {"error": str(e)}, headers=[("Retry-After", "10")])
+        except (ValueError, TypeError) as e:
+            self.send_json(400, {"error": str(e)})
+        else:
+            self.send_json(200 if job["status"] == "done" else 202, job)
+
+    def log_message(self, format, *args):
+        pass  # clients poll every second, the service prints its jobs instead
+
+
+class ServiceResult:
+    # same fields the app reads from RJobResult / EngineResult
+    def __init__(self, returncode, value=None, stderr="", cancelled=False):
+        self.returncode = returncode
+        self.value = value
+        self.stdout = ""
+        self.stderr = stderr
+        self.cancelled = cancelled
+
+
+class ServiceRequest:
+    # one job sent to the service; run() waits for it, cancel() stops waiting
+    # (the job keeps running on the service for other clients)
+    def __init__(self, client, payload):
+        self.client = client
+        self.payload = payload
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self, on_event=None, poll_seconds=1.0):
+        try:
+            job = self.client.submit(self.payload)
+            seen = 0
+            while True:
+                for event in job["events"][seen:]:
+                    if on_event is not None:
+                        on_event(dict(event, source="service"))
+                seen = len(job["events"])
+                if job["status"] == "done":
+                    return ServiceResult(0, job["result"])
+                if job["status"] == "failed":
+                    return ServiceResult(1, stderr=job["error"] or "job failed on the service")
+                if self.cancelled:
+                    return ServiceResult(-1, cancelled=True)
+                time.sleep(poll_seconds)
+                job = self.client.job(job["id"])
+        except ServiceError as e:
+            return ServiceResult(1, stderr=str(e))
+
+
+class ServiceClient:
+    # http client of the service, stdlib only
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _call(self, method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error")
+            except ValueError:
+                message = None
+            raise ServiceError(message or f"service answered {e.code}")
+        except (urllib.error.URLError, OSError) as e:
+            raise ServiceError(f"analysis service not reachable at {self.url}: {e}")
+
+    def submit(self, payload):
+        return self._call("POST", "/jobs", payload)
+
+    def job(self, key):
+        return self._call("GET", f"/jobs/{key}")
+
+    def status(self):
+        return self._call("GET", "/status")
+
+    def request(self, payload):
+        return ServiceRequest(self, payload)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Shared analysis service for the topic modeling app.")
+    parser.add_argument("--host", default=config["host"], help="address to listen on")
+    parser.add_argument("--port", type=int, default=config["port"])
+    parser.add_argument("--workers", type=int, default=config["workers"], help="jobs running side by side")
+    parser.add_argument("--queue-size", type=int, default=config["queue_size"], help="jobs waiting at most")
+    parser.add_argument("--cache-dir", default=config["service_cache_dir"], help="result cache directory")
+    parser.add_argument("--rscript", help="path to Rscript (default: registry on windows, PATH elsewhere)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # word clouds are drawn without a display
+    import matplotlib
+    matplotlib.use("Agg")
+
+    service = AnalysisService(args.cache_dir, args.workers, args.queue_size, rscript=args.rscript)
+    server = http.server.ThreadingHTTPServer((args.host, args.port), ServiceHandler)
+    server.service = service
+    print(f"analysis service on http://{args.host}:{args.port} ({service.workers} workers, "
+          f"queue of {args.queue_size}, results in {service.cache_dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if service._r_pool is not None:
+            service._r_pool.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
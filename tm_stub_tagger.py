@@ -0,0 +1,36 @@
+# ---------------------------------------
+# stub tagger
+# ---------------------------------------
+# stands in for tree-tagger-flush in tests and benchmarks without treetagger:
+# reads one token per line and writes "token<TAB>tag<TAB>lemma" right away,
+# lines that look like sgml tags are passed through (like -sgml). the lemma
+# is the lowercased token with a plural -s/-en ending cut off, so the lemma
+# cache and the pool see a real mapping. command line arguments are ignored.
+#
+#   "tagger": "pool", "tagger_command": [sys.executable, "tm_stub_tagger.py"]
+
+import sys
+
+
+def lemma(token):
+    word = token.lower()
+    for ending in ("en", "s"):
+        if len(word) > len(ending) + 3 and word.endswith(ending):
+            return word[:-len(ending)]
+    return word
+
+
+def main():
+    stdin = open(sys.stdin.fileno(), encoding="utf-8", newline="\n")
+    stdout = open(sys.stdout.fileno(), "w", encoding="utf-8", newline="\n")
+    for line in stdin:
+        token = line.rstrip("\r\n")
+        if token.startswith("<") and token.endswith(">"):
+            stdout.write(token + "\n")
+        else:
+            stdout.write(f"{token}\tNN\t{lemma(token)}\n")
+        stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
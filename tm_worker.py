@@ -0,0 +1,271 @@
+# ---------------------------------------
+# persistent r worker pool
+# ---------------------------------------
+# the app used to start a fresh Rscript for every button click, which
+# re-attached (and checked) all r packages before any work happened.
+# a worker started from "TM Worker.R" loads the packages once and then
+# runs analysis/export scripts sent to it as json lines over stdin.
+
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import uuid
+
+
+WORKER_SCRIPT_NAME = "TM Worker.R"
+READY_MARKER = "TM_WORKER_READY"
+DONE_MARKER = "TM_JOB_DONE"
+
+
+def find_r_exe_from_registry():
+    # find rscript path from registry
+    import winreg
+    try:
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SOFTWARE\\R-Core\\R") as key:
+            r_home, _ = winreg.QueryValueEx(key, "InstallPath")
+            return os.path.join(r_home, "bin", "Rscript.exe")
+    except FileNotFoundError:
+        raise FileNotFoundError("r not installed or not found in registry.")
+
+
+def find_rscript():
+    # rscript from the registry on windows, from the PATH elsewhere
+    if os.name == "nt":
+        return find_r_exe_from_registry()
+    path = shutil.which("Rscript")
+    if path is None:
+        raise FileNotFoundError("Rscript not found on the PATH.")
+    return path
+
+
+def kill_process_tree(process):
+    # kill rscript together with the tagger processes it started
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == "nt":
+            subprocess.call(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        process.kill()
+
+
+def default_worker_script():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), WORKER_SCRIPT_NAME)
+
+
+class RJobResult:
+    # same fields the app used to read from a finished Popen
+    def __init__(self, returncode, stdout, stderr, cancelled=False):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.cancelled = cancelled
+
+
+class RWorkerCrashed(RuntimeError):
+    pass
+
+
+class RJobCancelled(RuntimeError):
+    pass
+
+
+class RWorker:
+    # one long-lived Rscript process running "TM Worker.R"
+    def __init__(self, r_exe_path, worker_script=None):
+        self.r_exe_path = r_exe_path
+        self.worker_script = worker_script or default_worker_script()
+        self.process = None
+        self._stderr_lines = []
+        self._on_stderr = None
+        self._stderr_thread = None
+        self._cancelled = False
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        # start the process and block until the libraries are loaded
+        self.stop()
+        self.process = subprocess.Popen(
+            [self.r_exe_path, self.worker_script],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, encoding="utf-8", errors="replace", bufsize=1,
+            start_new_session=(os.name != "nt")
+        )
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, args=(self.process,), daemon=True)
+        self._stderr_thread.start()
+
+        for line in self.process.stdout:
+            if line.strip() == READY_MARKER:
+                return
+        code = self.process.wait()
+        self.process = None
+        raise RWorkerCrashed(f"r worker exited during startup (exit code {code}):\n" + "".join(self._stderr_lines))
+
+    def _drain_stderr(self, process):
+        # stderr must always be read, otherwise r blocks once the pipe is full
+        for line in process.stderr:
+            self._stderr_lines.append(line)
+            callback = self._on_stderr
+            if callback:
+                callback(line.rstrip("\n"))
+
+    def run(self, script, args, on_stderr=None):
+        # run one script inside the worker; returns an RJobResult
+        if not self.alive():
+            self.start()
+
+        job_id = uuid.uuid4().hex
+        fd, stdout_path = tempfile.mkstemp(prefix="tm_job_", suffix=".txt")
+        os.close(fd)
+        self._stderr_lines = []
+        self._on_stderr = on_stderr
+        self._cancelled = False
+
+        job = {"id": job_id, "script": script, "args": [str(a) for a in args], "stdout": stdout_path}
+        try:
+            try:
+                self.process.stdin.write(json.dumps(job) + "\n")
+                self.process.stdin.flush()
+            except OSError:
+                self._mark_dead()
+                raise RWorkerCrashed("r worker stopped before the job could be sent")
+
+            status = None
+            for line in self.process.stdout:
+                parts = line.split()
+                if len(parts) == 3 and parts[0] == DONE_MARKER and parts[1] == job_id:
+                    status = parts[2]
+                    break
+            if status is None:
+                self._mark_dead()
+                if self._cancelled:
+                    raise RJobCancelled("job cancelled")
+                raise RWorkerCrashed("r worker crashed while running " + os.path.basename(script))
+
+            with open(stdout_path, encoding="utf-8", errors="replace") as file:
+                stdout = file.read()
+            return RJobResult(0 if status == "ok" else 1, stdout, "".join(self._stderr_lines))
+        finally:
+            self._on_stderr = None
+            try:
+                os.remove(stdout_path)
+            except OSError:
+                pass
+
+    def cancel(self):
+        # abort the running job; the worker is started again for the next job
+        process = self.process
+        if process is not None:
+            self._cancelled = True
+            kill_process_tree(process)
+
+    def _mark_dead(self):
+        process = self.process
+        self.process = None
+        if process is not None:
+            try:
+                kill_process_tree(process)
+                process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+
+    def stop(self):
+        # close stdin so the worker leaves its read loop, kill it if it hangs
+        process = self.process
+        self.process = None
+        if process is None or process.poll() is not None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+
+
+class RJob:
+    # a job submitted to the pool; runs on its own thread
+    def __init__(self, pool, script, args, on_stderr=None, on_done=None):
+        self.pool = pool
+        self.script = script
+        self.args = args
+        self.on_stderr = on_stderr
+        self.on_done = on_done
+        self.worker = None
+        self.result = None
+        self.cancelled = False
+        self._done = threading.Event()
+
+    def cancel(self):
+        self.cancelled = True
+        worker = self.worker
+        if worker is not None:
+            worker.cancel()
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.result
+
+
+class RWorkerPool:
+    # fixed number of workers, started lazily and restarted after a crash
+    def __init__(self, r_exe_path, size=1, worker_script=None):
+        self.size = max(1, int(size))
+        self.workers = [RWorker(r_exe_path, worker_script) for _ in range(self.size)]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def submit(self, script, args, on_stderr=None, on_done=None, retries=1):
+        # run a script in the background; on_done(result) is called from the job thread
+        job = RJob(self, script, args, on_stderr, on_done)
+        threading.Thread(target=self._run_job, args=(job, retries), daemon=True).start()
+        return job
+
+    def run(self, script, args, on_stderr=None, retries=1):
+        # blocking variant of submit
+        return self.submit(script, args, on_stderr=on_stderr, retries=retries).wait()
+
+    def _run_job(self, job, retries):
+        worker = self._idle.get()
+        job.worker = worker
+        try:
+            attempt = 0
+            while True:
+                if job.cancelled:
+                    job.result = RJobResult(-1, "", "", cancelled=True)
+                    break
+                try:
+                    job.result = worker.run(job.script, job.args, on_stderr=job.on_stderr)
+                    break
+                except RJobCancelled:
+                    job.result = RJobResult(-1, "", "".join(worker._stderr_lines), cancelled=True)
+                    break
+                except OSError as e:
+                    # rscript could not be started at all, retrying will not help
+                    job.result = RJobResult(-1, "", f"could not start r: {e}")
+                    break
+                except RWorkerCrashed as e:
+                    if attempt >= retries:
+                        job.result = RJobResult(-1, "", str(e) + "\n" + "".join(worker._stderr_lines))
+                        break
+                    attempt += 1
+        finally:
+            job.worker = None
+            self._idle.put(worker)
+            job._done.set()
+        if job.on_done:
+            job.on_done(job.result)
+
+    def shutdown(self):
+        for worker in self.workers:
+            worker.stop()